@@ -0,0 +1,200 @@
+'''
+Start up the programs that make up the rest of my session.
+
+This replaces the old autostart.sh which slept for a second and then ran
+`ps -aux | awk` once per daemon to see if it needed starting. Here, services
+are declared along with what they depend on and how to tell when they are
+ready. On start (and restart) we:
+    - scan /proc once to see what is already running
+    - start everything that is missing, in parallel where possible
+    - start dependants as soon as the things they depend on are ready
+      (rather than sleeping and hoping)
+
+Readiness is one of:
+    EXITED  :: the command has finished (i.e. xrandr)
+    RUNNING :: the process has been exec'd. NOTE :: this says nothing about
+               whether it has finished starting up: use a function if
+               dependants actually need the service
+    a function returning True once the service is ready (i.e. owns_selection)
+'''
+import asyncio
+import os
+import shlex
+import subprocess
+import time
+
+from libqtile.log_utils import logger
+
+from helpers import ProcessIndex
+
+
+EXITED = 'exited'
+RUNNING = 'running'
+
+
+def owns_selection(name):
+    '''
+    Readiness check for daemons that announce themselves by taking ownership
+    of an X selection (i.e. the XSETTINGS manager in mate-settings-daemon).
+    '''
+    def _ready():
+        from libqtile import hook
+        conn = hook.qtile.conn
+        reply = conn.conn.core.GetSelectionOwner(conn.atoms[name]).reply()
+        return reply.owner != 0
+
+    return _ready
+
+
+class Service:
+    '''
+    Something to run on start up.
+        name    :: used for `after` and (by default) to see if we are running
+        cmd     :: command line to run
+        process :: process name to look for if it isn't `name`
+        after   :: names of services that need to be ready first
+        ready   :: EXITED, RUNNING or a function returning True when ready
+        restart :: if False then this is a one shot command that is always
+                   run when qtile first starts and never on restart
+        when    :: optional function: the service is skipped if it is False
+    '''
+    def __init__(self, name, cmd, process=None, after=(), ready=RUNNING,
+                 restart=True, when=None, timeout=10):
+        self.name = name
+        self.args = shlex.split(cmd)
+        self.process = process or name
+        self.after = tuple(after)
+        self.ready = ready
+        self.restart = restart
+        self.when = when
+        self.timeout = timeout
+
+
+def _ordered(services):
+    '''Services in dependency order: raises ValueError on bad dependencies'''
+    by_name = {s.name: s for s in services}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(service):
+        if service.name in done:
+            return
+        if service.name in visiting:
+            raise ValueError('Dependency cycle at %s' % service.name)
+
+        visiting.add(service.name)
+        for dep in service.after:
+            if dep not in by_name:
+                raise ValueError('%s depends on unknown service %s' % (
+                    service.name, dep))
+            visit(by_name[dep])
+        visiting.discard(service.name)
+
+        done.add(service.name)
+        ordered.append(service)
+
+    for service in services:
+        visit(service)
+
+    return ordered
+
+
+class Autostart:
+    '''Start any services that aren't already running'''
+    poll_interval = 0.05
+
+    def __init__(self, services):
+        self.services = _ordered(services)
+
+    async def _wait_ready(self, service, proc):
+        if service.ready == EXITED:
+            await asyncio.wait_for(proc.wait(), service.timeout)
+            return
+
+        if service.ready == RUNNING:
+            # create_subprocess_exec only returns once the exec has succeeded
+            return
+
+        deadline = time.monotonic() + service.timeout
+        while time.monotonic() < deadline:
+            if proc.returncode is not None:
+                raise RuntimeError('exited with code %d' % proc.returncode)
+            if service.ready():
+                return
+
+            await asyncio.sleep(self.poll_interval)
+
+        raise asyncio.TimeoutError()
+
+    async def _start(self, service, deps, running, restarting):
+        # Dependants still get started if a dependency fails: that is no
+        # worse than the old script
+        await asyncio.gather(*deps, return_exceptions=True)
+
+        if restarting and not service.restart:
+            return
+        if service.when is not None and not service.when():
+            return
+        if service.restart and service.process in running:
+            return
+
+        logger.info('autostart: starting %s', service.name)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *service.args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            await self._wait_ready(service, proc)
+        except Exception as e:
+            logger.error('autostart: %s failed: %r', service.name, e)
+            raise
+
+    async def run(self, restarting=False):
+        running = ProcessIndex()
+        tasks = {}
+
+        for service in self.services:
+            deps = [tasks[d] for d in service.after]
+            tasks[service.name] = asyncio.ensure_future(
+                self._start(service, deps, running, restarting))
+
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+def start_services(services, restarting=False, loop=None):
+    '''Kick off the autostart on the event loop without waiting for it'''
+    loop = loop or asyncio.get_event_loop()
+    return asyncio.ensure_future(
+        Autostart(services).run(restarting), loop=loop)
+
+
+SERVICES = [
+    # Set screen resolutions (add additional screens here)
+    Service("xrandr", "xrandr --output eDP1 --mode 1920x1080",
+            ready=EXITED, restart=False),
+    # NOTE :: The wallpaper is set from config.py (see wallpaper.py)
+    # Bring in mate utils for managing the session. The settings daemon takes
+    # the XSETTINGS selection once its plugins are loaded.
+    Service("mate-settings-daemon", "mate-settings-daemon", after=["xrandr"],
+            ready=owns_selection("_XSETTINGS_S0")),
+    Service("mintupdate-launcher", "mintupdate-launcher",
+            after=["mate-settings-daemon"]),
+    Service("mate-power-manager", "mate-power-manager",
+            after=["mate-settings-daemon"]),
+    # Compton visual compositing but not for qtile as it messes things up
+    Service("compton", "compton -CG", after=["xrandr"],
+            when=lambda: not os.environ.get("RUNNING_QTILE")),
+    # Network manager
+    Service("nm-applet", "nm-applet", after=["mate-settings-daemon"]),
+    # Auto-mount external drives
+    Service("udiskie", "udiskie -a -n -t", after=["mate-settings-daemon"]),
+    # Start the keyring daemon for managing ssh keys
+    Service("gnome-keyring-daemon", "gnome-keyring-daemon -s",
+            ready=EXITED),
+    # Notification daemon
+    Service("dunst", "dunst", after=["xrandr"]),
+    # Music server
+    Service("mopidy", "python2 -m mopidy"),
+]
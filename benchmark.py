@@ -0,0 +1,348 @@
+'''
+Headless benchmarks for the hot paths in this config.
+
+config.py, bindings.py and widgets.py are imported as normal (so qtile needs
+to be installed) but are driven by a fake qtile object rather than a running
+window manager, so no X server is needed. Timed:
+    remove_scratchpad_on_group_change :: the setgroup hook
+    focus_or_switch                   :: an M-<n> press (4 screens)
+    show_scratchpad                   :: an M-/ press
+    make_screen                       :: building a screen and its widgets
+    make_secondary_screen             :: the same for an additional monitor
+    shellscript_poll                  :: ShellScript.poll with a stub script
+
+Results are written as JSON so that runs can be compared:
+    $ python3 benchmark.py [-n 1000] [-o results.json] [--compare old.json]
+'''
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# ----------------------------------------------------------------------------
+# .: A fake qtile :.
+class FakeWindow:
+    def __init__(self, qtile, name):
+        self.qtile = qtile
+        self.name = name
+        self.group = None
+        self.floating = False
+
+    def togroup(self, group_name):
+        self.qtile.groupMap[group_name].add(self)
+
+
+class FakeGroup:
+    def __init__(self, name):
+        self.name = name
+        self.screen = None
+        self.windows = []
+        self.focusHistory = []
+
+    def add(self, window):
+        if window.group is not None:
+            window.group.remove(window)
+        window.group = self
+        self.windows.append(window)
+        self.focusHistory.append(window)
+
+    def remove(self, window):
+        self.windows.remove(window)
+        self.focusHistory.remove(window)
+        window.group = None
+
+
+class FakeScreen:
+    def __init__(self, qtile, index, group):
+        self.qtile = qtile
+        self.index = index
+        self.group = None
+        self.previous_group = None
+        self.setGroup(group, fire=False)
+
+    def setGroup(self, group, fire=True):
+        if group is self.group:
+            return
+
+        if group.screen is not None:
+            # Swap with the screen that is showing the group (like qtile)
+            group.screen.group = self.group
+            self.group.screen = group.screen
+        elif self.group is not None:
+            self.group.screen = None
+
+        self.previous_group, self.group = self.group, group
+        group.screen = self
+
+        if fire:
+            for callback in self.qtile.on_setgroup:
+                callback()
+
+
+class FakeQtile:
+    '''Just enough of qtile for the functions in the config'''
+    def __init__(self, n_groups=10, n_screens=4, windows_per_group=5):
+        self.groups = [FakeGroup(str(i + 1)) for i in range(n_groups)]
+        self.groups.append(FakeGroup('scratchpad'))
+        self.groupMap = {g.name: g for g in self.groups}
+        self.screens = [
+            FakeScreen(self, i, self.groups[i]) for i in range(n_screens)
+        ]
+        self.currentScreen = self.screens[0]
+        self.on_setgroup = []
+
+        for group in self.groups[:n_groups]:
+            for i in range(windows_per_group):
+                FakeWindow(self, '%s-%d' % (group.name, i)).togroup(group.name)
+
+    @property
+    def currentGroup(self):
+        return self.currentScreen.group
+
+    def toScreen(self, index):
+        self.currentScreen = self.screens[index]
+
+    def call_later(self, delay, func, *args):
+        return None
+
+
+# ----------------------------------------------------------------------------
+# .: Benchmarks :.
+def _lazy_target(lazy_call):
+    '''The function wrapped by lazy.function(...)'''
+    return lazy_call.args[0]
+
+
+def bench_remove_scratchpad(config, qtile):
+    '''The setgroup hook with two scratchpad windows showing'''
+    from libqtile import hook
+    from scratchpads import registry
+
+    hook.qtile = qtile
+    for i in range(2):
+        window = FakeWindow(qtile, 'pad-%d' % i)
+        window.togroup('scratchpad')
+        registry.add(window)
+
+    def setup():
+        # Show the scratchpad windows on group 1 again (not timed)
+        for window in qtile.groupMap['scratchpad'].windows[:2]:
+            window.togroup('1')
+            registry.moved(window, '1')
+        qtile.currentScreen.previous_group = qtile.groupMap['1']
+
+    def run():
+        config.remove_scratchpad_on_group_change()
+
+    return setup, run
+
+
+def bench_focus_or_switch(config, qtile):
+    '''Cycle through M-1 ... M-0 with the hooks that would fire'''
+    import bindings
+    from libqtile import hook
+    from workspaces import index
+
+    hook.qtile = qtile
+    qtile.on_setgroup = [
+        config.remove_scratchpad_on_group_change,
+        config.update_workspace_index,
+    ]
+    index.sync(qtile)
+
+    presses = [
+        _lazy_target(bindings.focus_or_switch(g.name))
+        for g in qtile.groups if g.name != 'scratchpad'
+    ]
+    state = {'ix': 0}
+
+    def run():
+        state['ix'] = (state['ix'] + 1) % len(presses)
+        presses[state['ix']](qtile)
+
+    return run
+
+
+def bench_show_scratchpad(config, qtile):
+    '''Cycle through three scratchpad windows'''
+    import bindings
+    from scratchpads import registry
+
+    for i in range(3):
+        window = FakeWindow(qtile, 'pad-%d' % i)
+        window.togroup('scratchpad')
+        registry.add(window)
+
+    def run():
+        bindings.show_scratchpad(qtile)
+
+    return run
+
+
+def bench_make_screen(config, qtile):
+    def run():
+        # Bar widgets are only created when the bar is configured
+        config.make_screen().top.build()
+
+    return run
+
+
+def bench_make_secondary_screen(config, qtile):
+    def run():
+        config.make_secondary_screen().top.build()
+
+    return run
+
+
+def bench_shellscript_poll(config, qtile, script_dir):
+    from widgets import ShellScript
+
+    fname = 'bench-stub.sh'
+    with open(os.path.join(script_dir, fname), 'w') as f:
+        f.write('#!/bin/sh\necho "<span>stub</span>"\n')
+    os.chmod(os.path.join(script_dir, fname), 0o755)
+
+    widget = ShellScript(fname=fname, script_dir=script_dir + os.sep)
+
+    def run():
+        widget.poll()
+
+    return run
+
+
+BENCHMARKS = [
+    ('remove_scratchpad_on_group_change', bench_remove_scratchpad, 1),
+    ('focus_or_switch', bench_focus_or_switch, 1),
+    ('show_scratchpad', bench_show_scratchpad, 1),
+    ('make_screen', bench_make_screen, 0.05),
+    ('make_secondary_screen', bench_make_secondary_screen, 0.05),
+    ('shellscript_poll', bench_shellscript_poll, 0.1),
+]
+
+
+def _time(func, repeat, setup=None):
+    '''Time `func` `repeat` times, calling `setup` (untimed) before each'''
+    if setup is not None:
+        setup()
+    func()  # warm up
+
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return {
+        'n': repeat,
+        'min_us': min(times) * 1e6,
+        'median_us': statistics.median(times) * 1e6,
+        'mean_us': statistics.mean(times) * 1e6,
+        'max_us': max(times) * 1e6,
+    }
+
+
+def _reset_registries():
+    '''Each benchmark gets a clean scratchpad registry / workspace index'''
+    import scratchpads
+    import workspaces
+
+    scratchpads.registry.__init__()
+    workspaces.index.__init__()
+
+
+def run_all(repeat=1000, only=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, here)
+
+    start = time.perf_counter()
+    import config
+    import_time = time.perf_counter() - start
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=here,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    results = {'config_import': {'n': 1, 'min_us': import_time * 1e6}}
+
+    with tempfile.TemporaryDirectory() as script_dir:
+        for name, bench, scale in BENCHMARKS:
+            if only and name not in only:
+                continue
+
+            _reset_registries()
+            qtile = FakeQtile()
+            if bench is bench_shellscript_poll:
+                func = bench(config, qtile, script_dir)
+            else:
+                func = bench(config, qtile)
+
+            # Benchmarks return either `run` or `(setup, run)`
+            setup = None
+            if isinstance(func, tuple):
+                setup, func = func
+
+            results[name] = _time(func, max(1, int(repeat * scale)), setup)
+
+    return {
+        'time': time.time(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(old, new):
+    '''Median times of two runs side by side'''
+    lines = ['%-35s %12s %12s %8s' % (
+        'benchmark', 'old us', 'new us', 'ratio')]
+    for name, result in new['results'].items():
+        new_t = result.get('median_us', result['min_us'])
+        prev = old['results'].get(name)
+        if prev is None:
+            lines.append('%-35s %12s %12.1f %8s' % (name, '-', new_t, '-'))
+            continue
+
+        old_t = prev.get('median_us', prev['min_us'])
+        lines.append('%-35s %12.1f %12.1f %7.2fx' % (
+            name, old_t, new_t, new_t / old_t if old_t else 0))
+
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    repeat, out, baseline, only = 1000, None, None, []
+
+    while args:
+        arg = args.pop(0)
+        if arg == '-n':
+            repeat = int(args.pop(0))
+        elif arg == '-o':
+            out = args.pop(0)
+        elif arg == '--compare':
+            baseline = args.pop(0)
+        else:
+            only.append(arg)
+
+    results = run_all(repeat, only)
+
+    if out:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if baseline:
+        with open(baseline) as f:
+            print(compare(json.load(f), results), file=sys.stderr)
@@ -20,48 +20,75 @@ I'm not being 100% consistent but in general:
 Anything bound to arrow keys is movement based. I'm having problems binding
 `M-C={h,j,k,l}` which is preventing me using that for movement. (Though this
 may be something to do with my own ez_keys function...!)
+
+Key specs are compiled and checked by keytable.py when the config loads, so
+typos and duplicate bindings show up straight away. `M-A-k` re-reads this
+file and only re-grabs the bindings that have changed.
 '''
+import importlib
 import os
+import sys
 
-from libqtile.config import Click, Drag, EzKey
+from libqtile.config import Click, Drag
 from libqtile.command import lazy
 
 from settings import MOD, TERMINAL, ACME_SCRIPT_DIR
 from helpers import script, notify
 from groups import groups
+from scratchpads import registry as scratchpad_registry
+from workspaces import index as workspace_index
+from keytable import compile_keys, apply_key_table
 
 
 def switch_screens(target_screen):
-    '''Send the current group to the other screen.'''
+    '''
+    Send the current group to `target_screen`. If we are already on that
+    screen, pull over the group from the screen we were on before.
+    '''
     @lazy.function
     def _inner(qtile):
-        current_group = qtile.screens[1 - target_screen].group
-        qtile.screens[target_screen].setGroup(current_group)
+        if target_screen >= len(qtile.screens):
+            return
+
+        source = qtile.currentScreen.index
+        if source == target_screen:
+            source = workspace_index.other_screen(qtile, target_screen)
+            if source is None:
+                return
+
+        qtile.screens[target_screen].setGroup(qtile.screens[source].group)
 
     return _inner
 
 
 def focus_or_switch(group_name):
     '''
-    Focus the selected group on the current screen or switch to the other
-    screen if the group is currently active there
+    Focus the selected group on the current screen or switch to the screen
+    that it is on if the group is currently active elsewhere
     '''
     @lazy.function
     def _inner(qtile):
-        # Check what groups are currently active
-        groups = [s.group.name for s in qtile.screens]
-
-        try:
+        index = workspace_index.screen_of(qtile, group_name)
+        if index is not None:
             # Jump to that screen if we are active
-            index = groups.index(group_name)
             qtile.toScreen(index)
-        except ValueError:
+        else:
             # We're not active so pull the group to the current screen
             qtile.currentScreen.setGroup(qtile.groupMap[group_name])
 
     return _inner
 
 
+def toggle_group(qtile):
+    '''
+    Switch the current screen back to the last group it showed, skipping any
+    groups that are now showing on another screen.
+    '''
+    name = workspace_index.last_hidden(qtile, qtile.currentScreen.index)
+    if name is not None:
+        qtile.currentScreen.setGroup(qtile.groupMap[name])
+
+
 def to_scratchpad(window):
     '''
     Mark the current window as a scratchpad. This resises it, sets it to
@@ -69,7 +96,7 @@ def to_scratchpad(window):
     '''
     try:
         window.togroup('scratchpad')
-        window.on_scratchpad = True
+        scratchpad_registry.add(window)
     except Exception as e:
         # No `scratchpad` group
         notify((
@@ -100,14 +127,9 @@ def show_scratchpad(qtile):
             ' group being defined! Define one in your config and restart'
             ' qtile to enable scratchpads.'
         ))
+        return
 
-    for w in list(qtile.currentGroup.windows):
-        if not hasattr(w, 'on_scratchpad'):
-            # Ensure that we don't get an attribute error
-            w.on_scratchpad = False
-
-        if w.on_scratchpad:
-            w.togroup('scratchpad')
+    scratchpad_registry.hide(qtile.currentGroup.name)
 
     if scratchpad.focusHistory:
         # We have at least one scratchpad window to display so show that last
@@ -115,11 +137,23 @@ def show_scratchpad(qtile):
         # windows in reverse order.
         last_window = scratchpad.focusHistory[-1]
         last_window.togroup(qtile.currentGroup.name)
+        if last_window in scratchpad_registry:
+            scratchpad_registry.moved(last_window, qtile.currentGroup.name)
+
+
+def reload_keys(qtile):
+    '''
+    Re-read the key bindings from this file and apply them without
+    re-grabbing the chords that haven't changed.
+    '''
+    module = sys.modules[__name__]
+    old_table = module.key_table
+    importlib.reload(module)
+    apply_key_table(qtile, old_table, module.key_table)
 
 
-# qtile actually has an emacs style `EzKey` helper that makes specifying
-# key bindings a lot nicer than the default.
-keys = [EzKey(k[0], *k[1:]) for k in [
+# Emacs style key specs: these get compiled into qtile Keys by keytable.py
+key_bindings = [
     # .: Movement :.
     # Swtich focus between panes
     ("M-<Up>", lazy.layout.up()),
@@ -201,10 +235,9 @@ keys = [EzKey(k[0], *k[1:]) for k in [
     # Move the focused group to one of the screens and follow it
     ("M-S-<bracketleft>", switch_screens(0), lazy.to_screen(0)),
     ("M-S-<bracketright>", switch_screens(1), lazy.to_screen(1)),
-    # Toggle between the two most recently used groups
-    # TODO :: Write my own version of this that has the same
-    #         screen preserving behaviour
-    ("M-<Tab>", lazy.screen.toggle_group()),
+    # Toggle between the two most recently used groups on this screen
+    # (without stealing groups from the other screens)
+    ("M-<Tab>", lazy.function(toggle_group)),
     # Close the current window: NO WARNING!
     ("M-S-q", lazy.window.kill()),
     ("M-S-<BackSpace>", lazy.window.kill()),
@@ -213,6 +246,8 @@ keys = [EzKey(k[0], *k[1:]) for k in [
     # Restart qtile in place and pull in config changes (check config before
     # doing this with `check-qtile-conf` script to avoid crashes)
     ("M-A-r", lazy.restart()),
+    # Reload just the key bindings from this file
+    ("M-A-k", lazy.function(reload_keys)),
     # Shut down qtile.
     ("M-A-<Escape>", lazy.shutdown()),
     ("M-A-l", lazy.spawn("lock-screen")),
@@ -223,20 +258,24 @@ keys = [EzKey(k[0], *k[1:]) for k in [
     ("M-o", lazy.spawn(os.path.join(ACME_SCRIPT_DIR, "afindfile.sh"))),
     ("M-s", lazy.spawn(os.path.join(
         ACME_SCRIPT_DIR, "acme-fuzzy-window-search.sh"))),
-]]
+]
 
 # .: Jump between groups and also throw windows to groups :. #
 for _ix, group in enumerate(groups[:10]):
     # Index from 1-0 instead of 0-9
     ix = 0 if _ix == 9 else _ix + 1
 
-    keys.extend([EzKey(k[0], *k[1:]) for k in [
+    key_bindings.extend([
         # M-ix = switch to that group
         # ("M-%d" % ix, lazy.group[group.name].toscreen()),
         ("M-%d" % ix, focus_or_switch(group.name)),
         # M-S-ix = switch to & move focused window to that group
         ("M-S-%d" % ix, lazy.window.togroup(group.name)),
-    ]])
+    ])
+
+# Parse + validate the specs (cached on disk) and build the Keys
+key_table = compile_keys(key_bindings)
+keys = list(key_table)
 
 # .: Use the mouse to drag floating layouts :. #
 mouse = [
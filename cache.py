@@ -0,0 +1,80 @@
+'''
+A disk backed cache of widget output.
+
+Some of my status scripts are slow (aptupgrades.sh runs a full aptitude solve)
+and qtile restarts every time the monitors change. Caching the last result
+means that the bar can be painted straight away with the previous value while
+the script is re-run in the background (stale-while-revalidate).
+
+Results are stored against a key (the script path) and a version (the mtime
+of the script) so that editing a script invalidates its cached output.
+'''
+import json
+import os
+import time
+
+from libqtile.log_utils import logger
+
+from settings import CACHE_DIR
+
+
+class ResultCache:
+    '''Last known output for each key, persisted as JSON'''
+    # Don't hit the disk just to refresh the timestamp of an unchanged result
+    # more often than this.
+    min_write_interval = 60
+
+    def __init__(self, path):
+        self.path = path
+        self._results = None
+
+    @property
+    def results(self):
+        if self._results is None:
+            try:
+                with open(self.path) as f:
+                    self._results = json.load(f)
+            except (OSError, ValueError):
+                self._results = {}
+
+        return self._results
+
+    def get(self, key, version=None):
+        '''Return (text, age in seconds) or None if we have nothing valid'''
+        result = self.results.get(key)
+        if result is None or result['version'] != version:
+            return None
+
+        return result['text'], time.time() - result['time']
+
+    def put(self, key, version, text):
+        '''Store the latest output for a key'''
+        now = time.time()
+        old = self.results.get(key)
+        self.results[key] = {'version': version, 'text': text, 'time': now}
+
+        unchanged = (
+            old is not None and
+            old['version'] == version and
+            old['text'] == text and
+            now - old['time'] < self.min_write_interval
+        )
+        if unchanged:
+            # Keep the old timestamp so that we write it out eventually
+            self.results[key] = old
+            return
+
+        self._save()
+
+    def _save(self):
+        tmp = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, 'w') as f:
+                json.dump(self.results, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            logger.exception('Unable to write widget cache to %s', self.path)
+
+
+result_cache = ResultCache(os.path.join(CACHE_DIR, 'widgets.json'))
@@ -0,0 +1,151 @@
+'''
+Long lived helper processes for handling clicks on ShellScript widgets.
+
+Running the script directly from `button_press` means forking (and copying
+the environment) in the middle of qtile's event handling, and scrolling over
+a widget can queue up dozens of processes. Instead, each script gets a helper
+process that is started on the first click. qtile writes
+"<button> <x> <y>" lines to the helper's stdin and carries on; the helper
+runs the script in the background.
+
+While the script is running, further clicks queue up in the pipe and are
+handled in order when the helper next reads. Scripts that are written to
+handle WIDGET_REPEAT can opt in to having runs of the same scroll event
+coalesced into a single run of the script, with WIDGET_REPEAT set to the
+number of steps. Every other script is run once per event so that no steps
+are lost.
+
+The helper exits when its stdin is closed (i.e. when qtile exits/restarts).
+'''
+import os
+import subprocess
+import sys
+
+
+SCROLL_BUTTONS = (4, 5)
+
+
+class ClickHelper:
+    '''The qtile side of a helper process for a single script'''
+    def __init__(self, fname, coalesce=False):
+        self.fname = fname
+        self.coalesce = coalesce
+        self.proc = None
+
+    def _start(self):
+        args = [sys.executable, os.path.abspath(__file__), self.fname]
+        if self.coalesce:
+            args.append('--coalesce')
+
+        self.proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            start_new_session=True,
+        )
+        os.set_blocking(self.proc.stdin.fileno(), False)
+
+    def send(self, button, x, y):
+        '''Pass a click to the helper without blocking'''
+        msg = ('%d %d %d\n' % (button, x, y)).encode()
+
+        for _ in range(2):
+            if self.proc is None or self.proc.poll() is not None:
+                self._start()
+
+            try:
+                os.write(self.proc.stdin.fileno(), msg)
+                return
+            except BlockingIOError:
+                # The helper is backed up: drop the click
+                return
+            except BrokenPipeError:
+                self.proc = None
+
+
+_helpers = {}
+
+
+def send_click(fname, button, x, y, coalesce=False):
+    '''
+    Send a click to the helper for `fname`, starting it if needed. Set
+    `coalesce` if the script reads WIDGET_REPEAT.
+    '''
+    key = (fname, coalesce)
+    helper = _helpers.get(key)
+    if helper is None:
+        helper = _helpers[key] = ClickHelper(fname, coalesce)
+
+    helper.send(button, x, y)
+
+
+# ----------------------------------------------------------------------------
+# .: Helper process :.
+def _coalesce(events, coalesce=True):
+    '''
+    Collapse runs of the same scroll event: [(button, x, y, repeat)]. With
+    `coalesce` unset every event is kept with a repeat of 1.
+    '''
+    merged = []
+    for button, x, y in events:
+        if coalesce and merged and button in SCROLL_BUTTONS and \
+                merged[-1][0] == button:
+            b, mx, my, repeat = merged[-1]
+            merged[-1] = (b, mx, my, repeat + 1)
+        else:
+            merged.append((button, x, y, 1))
+
+    return merged
+
+
+def _read_events(fd, buffered):
+    '''Block for at least one event then take everything that is waiting'''
+    data = os.read(fd, 4096)
+    if not data:
+        return None, buffered
+
+    os.set_blocking(fd, False)
+    try:
+        while True:
+            more = os.read(fd, 4096)
+            if not more:
+                break
+            data += more
+    except BlockingIOError:
+        pass
+    finally:
+        os.set_blocking(fd, True)
+
+    *lines, buffered = (buffered + data).split(b'\n')
+    events = []
+    for line in lines:
+        try:
+            button, x, y = (int(v) for v in line.split())
+        except ValueError:
+            continue
+        events.append((button, x, y))
+
+    return events, buffered
+
+
+def main(fname, coalesce=False):
+    fd = sys.stdin.fileno()
+    buffered = b''
+
+    while True:
+        events, buffered = _read_events(fd, buffered)
+        if events is None:
+            return
+
+        for button, x, y, repeat in _coalesce(events, coalesce):
+            env = dict(
+                os.environ,
+                WIDGET_BUTTON=str(button),
+                WIDGET_X_LOC=str(x),
+                WIDGET_Y_LOC=str(y),
+                WIDGET_REPEAT=str(repeat),
+            )
+            subprocess.run(fname, env=env, stdout=subprocess.DEVNULL)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], coalesce='--coalesce' in sys.argv[2:])
@@ -0,0 +1,295 @@
+'''
+In-process replacements for the status bar scripts in my scripts directory.
+
+Each collector reads straight from /proc and /sys and renders the same pango
+markup as the script it replaces, so a ShellScript widget can poll without
+forking a shell (and the pipeline of ip/awk/sed/upower that goes with it).
+
+Collectors are looked up by name:
+>>> ShellScript(collector="battery", fname="battery.sh", ...)
+
+If a collector can't read its source it raises CollectorUnavailable and the
+widget falls back to running the script instead.
+'''
+import fcntl
+import os
+import socket
+import struct
+
+from sampler import InterfaceRates, interface_rates, system_sampler
+
+
+COLLECTORS = {}
+
+SYS_NET = '/sys/class/net/'
+SYS_POWER = '/sys/class/power_supply/'
+PROC_ROUTE = '/proc/net/route'
+PROC_WIRELESS = '/proc/net/wireless'
+
+# ioctl request for reading the IPv4 address of an interface
+SIOCGIFADDR = 0x8915
+
+
+class CollectorUnavailable(Exception):
+    '''The data source for a collector can't be read on this machine'''
+
+
+def collector(name):
+    '''Register a collector class under `name`'''
+    def _register(cls):
+        COLLECTORS[name] = cls
+        return cls
+
+    return _register
+
+
+def get_collector(name, **config):
+    '''Create a new instance of the named collector'''
+    try:
+        return COLLECTORS[name](**config)
+    except KeyError:
+        raise ValueError('Unknown collector: %s' % name)
+
+
+def read_sys(path):
+    '''Read a single value from /proc or /sys'''
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError as e:
+        raise CollectorUnavailable(str(e))
+
+
+def default_interface():
+    '''The interface used for the default route (`ip route | awk ...`)'''
+    try:
+        with open(PROC_ROUTE) as f:
+            next(f)  # Skip the header
+            for line in f:
+                fields = line.split()
+                if fields[1] == '00000000':
+                    return fields[0]
+    except OSError as e:
+        raise CollectorUnavailable(str(e))
+
+    return None
+
+
+def operstate(interface):
+    '''The operational state of an interface: 'up', 'down', 'unknown'...'''
+    return read_sys(SYS_NET + interface + '/operstate')
+
+
+def interface_address(interface):
+    '''The IPv4 address of an interface (`ip route get 1 | cut ...`)'''
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            packed = fcntl.ioctl(
+                s.fileno(), SIOCGIFADDR,
+                struct.pack('256s', interface[:15].encode()))
+        except OSError:
+            # Interface exists but has no address assigned
+            return ''
+
+    return socket.inet_ntoa(packed[20:24])
+
+
+def spark(*values):
+    '''
+    Sparkline of the given values, mirroring the output of the `spark` shell
+    script used by wifi-signal.sh
+    '''
+    ticks = '▁▂▃▄▅▆▇█'
+    lo, hi = min(values), max(values)
+    step = max(((hi - lo) << 8) // (len(ticks) - 1), 1)
+    return ''.join(ticks[((v - lo) << 8) // step] for v in values)
+
+
+class Collector:
+    '''
+    Base class for collectors. Subclasses implement `poll` and return the
+    markup to display. Any keyword arguments given to the widget in
+    `collector_config` are available as attributes.
+    '''
+    defaults = {}
+
+    def __init__(self, **config):
+        for key, default in self.defaults.items():
+            setattr(self, key, config.pop(key, default))
+
+        if config:
+            raise ValueError('Unknown collector options: %s' % list(config))
+
+    def poll(self):
+        raise NotImplementedError
+
+
+@collector('battery')
+class Battery(Collector):
+    '''Replacement for battery.sh'''
+    defaults = {'instance': 'BAT0', 'alert_low': 10}
+
+    def poll(self):
+        path = SYS_POWER + self.instance + '/'
+        state = read_sys(path + 'status').lower()
+        percentage = int(read_sys(path + 'capacity'))
+
+        # Icon to indicate the current charge
+        if state == 'charging':
+            label = ''
+        elif percentage == 100:
+            label = ''
+        elif percentage > 75:
+            label = ''
+        elif percentage > 50:
+            label = ''
+        elif percentage > 25:
+            label = ''
+        elif percentage > 10:
+            label = ''
+        else:
+            label = ''
+
+        # Color based on state
+        if percentage == 100:
+            color = '#ebdbb2'
+        elif state == 'charging':
+            color = '#d3869b'
+        elif percentage < self.alert_low:
+            color = '#fb4934'
+        elif percentage < 26:
+            color = '#fe8019'
+        else:
+            color = '#b8bb26'
+
+        return "<span font='12' foreground='%s'> %s %d%% </span>" % (
+            color, label, percentage)
+
+
+@collector('wifi')
+class Wifi(Collector):
+    '''Replacement for wifi-signal.sh'''
+    defaults = {'interface': None}
+
+    def _quality(self):
+        '''Link quality (0-100) and the interface it is for'''
+        try:
+            with open(PROC_WIRELESS) as f:
+                lines = f.readlines()[2:]
+        except OSError as e:
+            raise CollectorUnavailable(str(e))
+
+        for line in lines:
+            iface, stats = line.split(':', 1)
+            iface = iface.strip()
+            if self.interface is None or iface == self.interface:
+                return iface, int(float(stats.split()[1]) * 100 / 70)
+
+        return self.interface, None
+
+    def poll(self):
+        interface, quality = self._quality()
+
+        if interface is None or quality is None:
+            return ''
+
+        if not os.path.isdir(SYS_NET + interface + '/wireless'):
+            return ''
+
+        if operstate(interface) == 'down':
+            return ''
+
+        if quality >= 80:
+            color, bars = '#b8bb26', spark(0, 1, 2, 3, 4)
+        elif quality >= 60:
+            color, bars = '#fabd2f', spark(0, 1, 2, 3, 0)
+        elif quality >= 40:
+            color, bars = '#fe8019', spark(0, 1, 2, 0, 0)
+        else:
+            color, bars = '#fb4934', spark(0, 1, 0, 0, 0)
+
+        return "<span  font='11' foreground='%s'>%s </span>" % (color, bars)
+
+
+@collector('bandwidth')
+class Bandwidth(Collector):
+    '''
+    Replacement for bandwidth.sh: counters are read by the shared sampler
+    (rather than kept in /dev/shm) and `smoothing` sets how many poll
+    intervals the displayed rate is averaged over. The sampler ticks more
+    often than we poll so we keep our own record of the counters at each
+    poll for this.
+    '''
+    defaults = {'interface': None, 'smoothing': 1}
+
+    def __init__(self, **config):
+        Collector.__init__(self, **config)
+        self._polls = {}
+
+    @staticmethod
+    def _format(rate, arrow):
+        rate = int(rate)
+        kib = rate >> 10
+        if rate > 1048576:
+            # bc with scale=1 truncates rather than rounding
+            value, unit = '%.1f' % (int(kib * 10 / 1024) / 10), 'M'
+        else:
+            value, unit = str(kib), 'K'
+
+        return (
+            "<span foreground='#ebdbb2'>%s</span>"
+            "<span font='12' foreground='#d5c4a1'>%s</span>"
+            "<span foreground='#83a598'>%s</span>"
+        ) % (value, unit, arrow)
+
+    def poll(self):
+        interface = self.interface or default_interface()
+        if interface is None or not os.path.exists(SYS_NET + interface):
+            return ''
+
+        if operstate(interface) != 'up':
+            return ''
+
+        # Counters are sampled from /proc/net/dev by the shared sampler
+        system_sampler.refresh()
+        latest = interface_rates(interface).latest()
+        if latest is None:
+            return ''
+
+        polls = self._polls.get(interface)
+        if polls is None:
+            polls = self._polls[interface] = InterfaceRates(self.smoothing + 1)
+        if not len(polls.times) or polls.times[-1] != latest[0]:
+            polls.sample(latest[1], latest[2], now=latest[0])
+
+        current = polls.rates(self.smoothing)
+        if current is None:
+            return ''
+
+        rx_rate, tx_rate = current
+        return (
+            self._format(tx_rate, '↑') +
+            "<span font='3' foreground='#282A2E'>.</span>" +
+            self._format(rx_rate, '↓')
+        )
+
+
+@collector('ipadr')
+class IPAddress(Collector):
+    '''Replacement for ipadr.sh'''
+    defaults = {}
+
+    def poll(self):
+        interface = default_interface()
+
+        if interface is None or operstate(interface) == 'down':
+            return (
+                "<span font='8' foreground='#83a598'> </span>"
+                "<span foreground='#9d0006'> X </span>"
+            )
+
+        return (
+            "<span font='8' foreground='#83a598'> </span>"
+            "<span font='8' foreground='#7c6f64'>/</span>"
+            "<span font='10' foreground='#ebdbb2'>%s </span>"
+        ) % interface_address(interface)
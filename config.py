@@ -7,211 +7,302 @@ There are probably some more good hooks to make use of in here:
 """
 import os
 
+# NOTE :: This needs to be first so that it can time everything else.
+#         (set PROFILE in settings.py or QTILE_PROFILE=1 to enable)
+from profiling import phase, timed, track_first_paint
+
 # qtile internals
-from libqtile import bar, widget
-from libqtile.config import Screen, hook
+with phase("import libqtile"):
+    from libqtile import widget
+    from libqtile.config import Screen, hook
+    from libqtile.log_utils import logger
 
 # Settings/helpers
-from settings import COLS, FONT_PARAMS, WITH_SYS_TRAY
-from helpers import run_script
+from settings import (
+    COLS, FONT_PARAMS, WITH_SYS_TRAY, SCREEN_CHANGE_DELAY,
+    SECONDARY_SCREEN_PROFILE,
+)
+from autostart import SERVICES, start_services
 
 # Import the parts of my config defined in other files
-from layouts import layouts, floating_layout    # NOQA
-from bindings import keys, mouse                # NOQA
-from groups import groups                       # NOQA
-from widgets import ShellScript
+with phase("import layouts"):
+    from layouts import layouts, floating_layout    # NOQA
+with phase("import bindings"):
+    from bindings import keys, mouse                # NOQA
+with phase("import groups"):
+    from groups import groups                       # NOQA
+with phase("import widgets"):
+    from widgets import (
+        ShellScript, EventScript, LazyBar,
+        SharedCPUGraph, SharedMemoryGraph, SharedNetGraph,
+    )
+from screens import ScreenChangeDebouncer, reconfigure_screens
+from scratchpads import registry as scratchpad_registry
+from workspaces import index as workspace_index
+from wallpaper import set_wallpaper
 
 
 # ----------------------------------------------------------------------------
 # Hooks
 @hook.subscribe.startup_complete
+@timed
 def autostart():
     """
-    My startup script has a sleep in it as some of the commands depend on
-    state from the rest of the init. This will cause start/restart of qtile
-    to hang slightly as the sleep runs.
+    Start anything from my session that isn't already running (see
+    autostart.py). This runs in the background on the event loop so it
+    doesn't hold up start/restart of qtile.
     """
+    restarting = 'RUNNING_QTILE' in os.environ
     os.environ.setdefault('RUNNING_QTILE', 'True')
-    run_script("autostart.sh")
+    start_services(SERVICES, restarting=restarting)
+    # Cheap after the first run: the scaled image is cached on disk
+    set_wallpaper(hook.qtile)
 
 
-@hook.subscribe.screen_change
-def restart_on_randr(qtile, ev):
+def reconfigure(qtile):
     """
-    Restart and reload config when screens are changed so that we correctly
-    init any new screens and correctly remove any old screens that we no
-    longer need.
+    Update our screens in place when monitors are added or removed so that we
+    correctly init any new screens and correctly remove any old screens that
+    we no longer need. Groups on removed screens are hidden, apart from the
+    group on the focused screen which moves (along with focus) to the first
+    remaining screen rather than being left 'stuck' on the invisible desktop.
 
-    There is an annoying side effect of removing a second monitor that results
-    in windows being 'stuck' on the now invisible desktop...
+    If anything goes wrong we fall back to restarting qtile.
     """
-    qtile.cmd_restart()
+    try:
+        reconfigure_screens(qtile, screens, make_secondary_screen)
+        workspace_index.sync(qtile)
+        set_wallpaper(qtile)
+    except Exception:
+        logger.exception("Unable to reconfigure screens: restarting")
+        qtile.cmd_restart()
+
+
+_screen_change = ScreenChangeDebouncer(reconfigure, SCREEN_CHANGE_DELAY)
+
+
+@hook.subscribe.screen_change
+@timed
+def reconfigure_on_randr(qtile, ev):
+    """
+    A single dock/undock fires several randr events: wait for them to settle
+    and then reconfigure once.
+    """
+    _screen_change(qtile)
 
 
 @hook.subscribe.setgroup
+@timed
 def remove_scratchpad_on_group_change():
     """
     If we were showing windows from the scratchpad when we move to a new
     group, we hide them again automatically.
     """
     previous_group = hook.qtile.currentScreen.previous_group
-    if not previous_group:
+    if not previous_group or not scratchpad_registry:
         # No windows to hide
         return
 
-    for w in list(previous_group.windows):
-        if w.on_scratchpad:
-            w.togroup('scratchpad')
+    scratchpad_registry.hide(previous_group.name)
 
 
-@hook.subscribe.client_new
-def init_scratchpad_on_new(window):
-    """
-    When a new window gets created, set the `on_scratchpad` property to false
-    so that it is there for us to filter on later when we use scratchpad
-    actions.
-    """
-    window.on_scratchpad = False
+@hook.subscribe.setgroup
+@timed
+def update_workspace_index():
+    """Keep track of which group is on which screen (see workspaces.py)."""
+    workspace_index.sync(hook.qtile)
+
+
+hook.subscribe.current_screen_change(update_workspace_index)
+
+
+@hook.subscribe.client_killed
+@timed
+def forget_scratchpad_on_kill(window):
+    """Stop tracking scratchpad windows once they are closed."""
+    scratchpad_registry.forget(window)
 
 
 # ----------------------------------------------------------------------------
-def make_screen(systray=False):
-    """Defined as a function so that I can duplicate this on other monitors"""
+@timed
+def make_screen(systray=False, profile="full"):
+    """
+    Defined as a function so that I can duplicate this on other monitors.
+    profile :: "full" for everything, "minimal" drops the graphs and script
+               widgets (see SECONDARY_SCREEN_PROFILE in settings.py).
+
+    The widgets aren't created until qtile configures the bar, so screens
+    that are never shown cost next to nothing.
+    """
+    if profile not in ("full", "minimal"):
+        raise ValueError("Unknown bar profile: %s" % profile)
+
     def _separator():
         # return widget.Sep(linewidth=2, foreground=COLS["dark_3"])
         return widget.Sep(linewidth=2, foreground=COLS["deus_1"])
 
-    blocks = [
-        # Marker for the start of the groups to give a nice bg: ◢■■■■■■■◤
-        widget.TextBox(
-            font="Arial", foreground=COLS["dark_4"],
-            # font="Arial", foreground=COLS["deus_3"],
-            text="◢", fontsize=50, padding=-1
-        ),
-        widget.GroupBox(
-            other_current_screen_border=COLS["orange_0"],
-            this_current_screen_border=COLS["blue_0"],
-            # this_current_screen_border=COLS["deus_2"],
-            other_screen_border=COLS["orange_0"],
-            this_screen_border=COLS["blue_0"],
-            # this_screen_border=COLS["deus_2"],
-            highlight_color=COLS["blue_0"],
-            # highlight_color=COLS["deus_2"],
-            urgent_border=COLS["red_1"],
-            background=COLS["dark_4"],
-            # background=COLS["deus_3"],
-            highlight_method="line",
-            inactive=COLS["dark_2"],
-            active=COLS["light_2"],
-            disable_drag=True,
-            borderwidth=2,
-            **FONT_PARAMS,
-        ),
-        # Marker for the end of the groups to give a nice bg: ◢■■■■■■■◤
-        widget.TextBox(
-            font="Arial", foreground=COLS["dark_4"],
-            # font="Arial", foreground=COLS["deus_3"],
-            text="◤ ", fontsize=50, padding=-5
-        ),
-        # Show the title for the focused window
-        widget.WindowName(**FONT_PARAMS),
-        # Allow for quick command execution
-        widget.Prompt(
-            cursor_color=COLS["light_3"],
-            # ignore_dups_history=True,
-            bell_style="visual",
-            prompt="λ : ",
-            **FONT_PARAMS
-        ),
-        _separator(),
-        # Resource usage graphs
-        widget.CPUGraph(
-            border_color=COLS["yellow_1"],
-            graph_color=COLS["yellow_1"],
-            border_width=1,
-            line_width=1,
-            type="line",
-            width=50,
-            **FONT_PARAMS
-        ),
-        widget.MemoryGraph(
-            border_color=COLS["blue_2"],
-            graph_color=COLS["blue_2"],
-            border_width=1,
-            line_width=1,
-            type="line",
-            width=50,
-            **FONT_PARAMS
-        ),
-        widget.NetGraph(
-            border_color=COLS["green_1"],
-            graph_color=COLS["green_1"],
-            border_width=1,
-            line_width=1,
-            type="line",
-            width=50,
-            **FONT_PARAMS
-        ),
-        # IP information
-        ShellScript(
-            fname="ipadr.sh",
-            update_interval=10,
-            markup=True,
-            padding=1,
-            **FONT_PARAMS
-        ),
-        # Available apt upgrades
-        ShellScript(
-            fname="aptupgrades.sh",
-            update_interval=600,
-            markup=True,
-            padding=1,
-            **FONT_PARAMS
-        ),
-        # Current battery level
-        ShellScript(
-            fname="battery.sh",
-            update_interval=60,
-            markup=True,
-            padding=1,
-            **FONT_PARAMS
-        ),
-        # Wifi strength
-        ShellScript(
-            fname="wifi-signal.sh",
-            update_interval=60,
-            markup=True,
-            padding=1,
-            **FONT_PARAMS
-        ),
-        # Volume % : scroll mouse wheel to change volume
-        widget.TextBox("", **FONT_PARAMS),
-        widget.Volume(**FONT_PARAMS),
-        _separator(),
-        # Current time
-        widget.Clock(
-            format="%Y-%m-%d %a %I:%M %p",
-            **FONT_PARAMS
-        ),
-        # Keyboard layout
-        widget.KeyboardLayout(
-            configured_keyboards=['us', 'gb'],
-            **FONT_PARAMS
-        ),
-        # Visual indicator of the current layout for this workspace.
-        widget.CurrentLayoutIcon(
-            custom_icon_paths=[os.path.expanduser("~/.config/qtile/icons")],
-            **FONT_PARAMS
-        ),
-    ]
-
-    if systray:
-        # Add in the systray and additional separator
-        blocks.insert(-1, widget.Systray())
-        blocks.insert(-1, _separator())
+    @timed
+    def build_bar_widgets():
+        blocks = [
+            # Marker for the start of the groups to give a nice bg: ◢■■■■■■■◤
+            widget.TextBox(
+                font="Arial", foreground=COLS["dark_4"],
+                # font="Arial", foreground=COLS["deus_3"],
+                text="◢", fontsize=50, padding=-1
+            ),
+            widget.GroupBox(
+                other_current_screen_border=COLS["orange_0"],
+                this_current_screen_border=COLS["blue_0"],
+                # this_current_screen_border=COLS["deus_2"],
+                other_screen_border=COLS["orange_0"],
+                this_screen_border=COLS["blue_0"],
+                # this_screen_border=COLS["deus_2"],
+                highlight_color=COLS["blue_0"],
+                # highlight_color=COLS["deus_2"],
+                urgent_border=COLS["red_1"],
+                background=COLS["dark_4"],
+                # background=COLS["deus_3"],
+                highlight_method="line",
+                inactive=COLS["dark_2"],
+                active=COLS["light_2"],
+                disable_drag=True,
+                borderwidth=2,
+                **FONT_PARAMS,
+            ),
+            # Marker for the end of the groups to give a nice bg: ◢■■■■■■■◤
+            widget.TextBox(
+                font="Arial", foreground=COLS["dark_4"],
+                # font="Arial", foreground=COLS["deus_3"],
+                text="◤ ", fontsize=50, padding=-5
+            ),
+            # Show the title for the focused window
+            widget.WindowName(**FONT_PARAMS),
+            # Allow for quick command execution
+            widget.Prompt(
+                cursor_color=COLS["light_3"],
+                # ignore_dups_history=True,
+                bell_style="visual",
+                prompt="λ : ",
+                **FONT_PARAMS
+            ),
+            _separator(),
+        ]
+
+        if profile == "full":
+            blocks.extend([
+                # Resource usage graphs (sharing a single sampler of /proc)
+                SharedCPUGraph(
+                    border_color=COLS["yellow_1"],
+                    graph_color=COLS["yellow_1"],
+                    border_width=1,
+                    line_width=1,
+                    type="line",
+                    width=50,
+                    **FONT_PARAMS
+                ),
+                SharedMemoryGraph(
+                    border_color=COLS["blue_2"],
+                    graph_color=COLS["blue_2"],
+                    border_width=1,
+                    line_width=1,
+                    type="line",
+                    width=50,
+                    **FONT_PARAMS
+                ),
+                SharedNetGraph(
+                    border_color=COLS["green_1"],
+                    graph_color=COLS["green_1"],
+                    border_width=1,
+                    line_width=1,
+                    type="line",
+                    width=50,
+                    **FONT_PARAMS
+                ),
+                # IP information: refreshed when interfaces/addresses/routes
+                # change
+                EventScript(
+                    fname="ipadr.sh",
+                    collector="ipadr",
+                    triggers=("link", "addr", "route"),
+                    update_interval=10,
+                    idle_interval=600,
+                    markup=True,
+                    padding=1,
+                    **FONT_PARAMS
+                ),
+                # Available apt upgrades
+                ShellScript(
+                    fname="aptupgrades.sh",
+                    update_interval=600,
+                    cache_ttl=3600,
+                    markup=True,
+                    padding=1,
+                    **FONT_PARAMS
+                ),
+                # Current battery level: refreshed on power_supply uevents
+                EventScript(
+                    fname="battery.sh",
+                    collector="battery",
+                    triggers=("uevent:power_supply",),
+                    update_interval=60,
+                    idle_interval=300,
+                    markup=True,
+                    padding=1,
+                    **FONT_PARAMS
+                ),
+                # Wifi strength: signal quality has no events so keep
+                # polling, but pick up the link going up/down straight away
+                EventScript(
+                    fname="wifi-signal.sh",
+                    collector="wifi",
+                    triggers=("link",),
+                    update_interval=60,
+                    idle_interval=60,
+                    markup=True,
+                    padding=1,
+                    **FONT_PARAMS
+                ),
+                # Volume % : scroll mouse wheel to change volume
+                widget.TextBox("", **FONT_PARAMS),
+                widget.Volume(**FONT_PARAMS),
+                _separator(),
+            ])
+
+        blocks.extend([
+            # Current time
+            widget.Clock(
+                format="%Y-%m-%d %a %I:%M %p",
+                **FONT_PARAMS
+            ),
+            # Keyboard layout
+            widget.KeyboardLayout(
+                configured_keyboards=['us', 'gb'],
+                **FONT_PARAMS
+            ),
+            # Visual indicator of the current layout for this workspace.
+            widget.CurrentLayoutIcon(
+                custom_icon_paths=[
+                    os.path.expanduser("~/.config/qtile/icons")
+                ],
+                **FONT_PARAMS
+            ),
+        ])
+
+        if systray:
+            # Add in the systray and additional separator
+            blocks.insert(-1, widget.Systray())
+            blocks.insert(-1, _separator())
+
+        return [track_first_paint(w) for w in blocks]
 
     # return Screen(top=bar.Bar(blocks, 25, background=COLS["deus_1"]))
-    return Screen(top=bar.Bar(blocks, 25, background=COLS["dark_2"]))
+    return Screen(
+        top=LazyBar(build_bar_widgets, 25, background=COLS["dark_2"]))
+
+
+def make_secondary_screen():
+    """Screens for any monitors other than the main one"""
+    return make_screen(profile=SECONDARY_SCREEN_PROFILE)
 
 
 # XXX : When I run qtile inside of mate, I don"t actually want a qtile systray
@@ -236,8 +327,9 @@ wmname = "LG3D"
 
 
 # ----------------------------------------------------------------------------
+@timed
 def main(qtile):
     """Optional entry point for the config"""
     # Make sure that we have a screen / bar for each monitor that is attached
     while len(screens) < len(qtile.conn.pseudoscreens):
-        screens.append(make_screen())
+        screens.append(make_secondary_screen())
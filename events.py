@@ -0,0 +1,236 @@
+'''
+Kernel event sources for event driven widgets.
+
+Rather than polling on a timer, widgets can ask to be told when something
+they care about changes. Topics are strings:
+    link, addr, route   :: rtnetlink notifications for interfaces going up or
+                           down, addresses changing and routes changing.
+    uevent:<subsystem>  :: udev style kernel uevents for a subsystem (i.e.
+                           uevent:power_supply for AC/battery changes).
+    file:<path>         :: inotify on a file. NOTE :: sysfs attributes only
+                           generate events if the driver calls sysfs_notify.
+
+All sources are non-blocking sockets/fds that are watched from the qtile
+event loop, so nothing wakes up unless the kernel has something to say.
+'''
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import socket
+import struct
+
+from libqtile.log_utils import logger
+
+
+NETLINK_ROUTE = 0
+NETLINK_KOBJECT_UEVENT = 15
+
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+
+RTM_TOPICS = {
+    16: 'link', 17: 'link',     # RTM_NEWLINK, RTM_DELLINK
+    20: 'addr', 21: 'addr',     # RTM_NEWADDR, RTM_DELADDR
+    24: 'route', 25: 'route',   # RTM_NEWROUTE, RTM_DELROUTE
+}
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+
+NLMSGHDR = struct.Struct('=IHHII')
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class _Source:
+    '''A file descriptor on the event loop that produces topics'''
+    def __init__(self, hub):
+        self.hub = hub
+        self.fd = None
+
+    def open(self, loop):
+        self.fd = self._open()
+        loop.add_reader(self.fd, self._readable)
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _read(self):
+        '''Return the set of topics in everything waiting on the fd'''
+        raise NotImplementedError
+
+    def _readable(self):
+        try:
+            topics = self._read()
+        except OSError:
+            logger.exception('Problem reading events')
+            return
+
+        for topic in topics:
+            self.hub.fire(topic)
+
+
+class RtnetlinkSource(_Source):
+    '''Link, address and route changes'''
+    def _open(self):
+        self.sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK,
+            NETLINK_ROUTE)
+        self.sock.bind((0, (
+            RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE |
+            RTMGRP_IPV6_IFADDR
+        )))
+        return self.sock.fileno()
+
+    def _read(self):
+        topics = set()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return topics
+
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+                if length < NLMSGHDR.size:
+                    break
+                if msg_type in RTM_TOPICS:
+                    topics.add(RTM_TOPICS[msg_type])
+                offset += (length + 3) & ~3
+
+
+class UeventSource(_Source):
+    '''Kernel uevents (what udev listens to)'''
+    def _open(self):
+        self.sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK,
+            NETLINK_KOBJECT_UEVENT)
+        self.sock.bind((os.getpid(), 1))
+        return self.sock.fileno()
+
+    def _read(self):
+        topics = set()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return topics
+
+            for field in data.split(b'\0'):
+                if field.startswith(b'SUBSYSTEM='):
+                    topics.add('uevent:' + field[10:].decode())
+                    break
+
+
+class InotifySource(_Source):
+    '''Changes to individual files'''
+    def __init__(self, hub):
+        _Source.__init__(self, hub)
+        self.watches = {}
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+    def _open(self):
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        return fd
+
+    def watch(self, path):
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), 'Unable to watch %s' % path)
+        self.watches[wd] = 'file:' + path
+
+    def _read(self):
+        topics = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return topics
+
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(data):
+                wd, _, _, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+                if wd in self.watches:
+                    topics.add(self.watches[wd])
+                offset += INOTIFY_EVENT.size + name_len
+
+
+class EventHub:
+    '''
+    Opens event sources on demand and dispatches topics to subscribers.
+    Callbacks are run on the event loop.
+    '''
+    def __init__(self):
+        self._sources = {}
+        self._subscribers = {}
+
+    def _source(self, kind, loop):
+        '''Get (opening if needed) a source. Returns None if unavailable'''
+        if kind not in self._sources:
+            source = {
+                'rtnetlink': RtnetlinkSource,
+                'uevent': UeventSource,
+                'inotify': InotifySource,
+            }[kind](self)
+
+            try:
+                source.open(loop)
+            except (OSError, AttributeError):
+                logger.exception('Unable to open %s events', kind)
+                source = None
+
+            self._sources[kind] = source
+
+        return self._sources[kind]
+
+    def subscribe(self, topic, callback, loop=None):
+        '''
+        Call `callback` whenever `topic` fires. Returns False if we are unable
+        to listen for the topic on this machine.
+        '''
+        loop = loop or asyncio.get_event_loop()
+
+        if topic in ('link', 'addr', 'route'):
+            source = self._source('rtnetlink', loop)
+        elif topic.startswith('uevent:'):
+            source = self._source('uevent', loop)
+        elif topic.startswith('file:'):
+            source = self._source('inotify', loop)
+            if source is not None and topic not in source.watches.values():
+                try:
+                    source.watch(topic[5:])
+                except OSError:
+                    logger.warning('Unable to watch %s', topic[5:])
+                    return False
+        else:
+            raise ValueError('Unknown event topic: %s' % topic)
+
+        if source is None:
+            return False
+
+        self._subscribers.setdefault(topic, []).append(callback)
+        return True
+
+    def unsubscribe(self, topic, callback):
+        callbacks = self._subscribers.get(topic, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def fire(self, topic):
+        for callback in list(self._subscribers.get(topic, ())):
+            try:
+                callback()
+            except Exception:
+                logger.exception('Problem handling %s event', topic)
+
+
+hub = EventHub()
@@ -1,17 +1,23 @@
 """
 My helper scripts for setting up qtile
 """
-from libqtile.config import Key
+from libqtile.log_utils import logger
 
+import asyncio
+import shlex
 import subprocess
 import os
 
-from settings import SCRIPT_DIR
+from settings import SCRIPT_DIR, WALLPAPER_DIR
+from notifications import notifier
+from keytable import compile_keys
 
 
 def run(cmd, with_output=False):
     """
-    Run an external command as a subprocess, optionally return the output
+    Run an external command as a subprocess, optionally return the output.
+    NOTE :: This blocks! Only use it off of the main thread (i.e. when
+            polling for widgets). Everything else should use `run_async`.
     """
     if with_output:
         result = subprocess.run(cmd.split(), stdout=subprocess.PIPE)
@@ -20,9 +26,132 @@ def run(cmd, with_output=False):
         subprocess.run(cmd.split())
 
 
-def wallpaper(fname):
-    """Set the wallpaper using feh"""
-    run("feh --bg-fill /home/innes/Pictures/Wallpapers/%s" % fname)
+async def _run_async(args, with_output, timeout):
+    stdout = subprocess.PIPE if with_output else subprocess.DEVNULL
+    proc = await asyncio.create_subprocess_exec(*args, stdout=stdout)
+
+    try:
+        output, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+
+    if with_output:
+        return output.decode()
+
+    return proc.returncode
+
+
+def _log_failure(future):
+    """Make sure that errors in fire and forget commands get logged"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Command failed: %r", future.exception())
+
+
+def run_async(cmd, with_output=False, timeout=None, loop=None):
+    """
+    Run an external command on the qtile event loop without blocking it.
+    `cmd` can be a string (split using shell rules) or a list of args.
+
+    Returns a future that resolves to the output of the command if
+    `with_output` is set or its return code otherwise. If the command takes
+    longer than `timeout` seconds it is killed and the future raises
+    asyncio.TimeoutError.
+    """
+    args = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+    loop = loop or asyncio.get_event_loop()
+    future = asyncio.ensure_future(
+        _run_async(args, with_output, timeout), loop=loop)
+    future.add_done_callback(_log_failure)
+
+    return future
+
+
+class ProcessIndex:
+    """
+    A snapshot of running processes from a single pass over /proc that can
+    answer any number of "is X running?" questions.
+
+    Processes are indexed by exact name rather than by regex (so 'dunst'
+    doesn't match 'dunstify') using their comm, the basename of argv[0] and,
+    for interpreters, the script or module being run so that things like
+    `python2 -m mopidy` can be found as 'mopidy'. (Other arguments are
+    ignored: `sh -c "... dunst ..."` is not dunst.)
+    """
+    interpreters = ("python", "python2", "python3", "perl", "ruby", "node",
+                    "sh", "bash", "zsh")
+
+    def __init__(self, proc="/proc"):
+        self.proc = proc
+        self.refresh()
+
+    def refresh(self):
+        """Re-scan /proc"""
+        self.pids = {}
+        self.cmdlines = {}
+
+        for pid in os.listdir(self.proc):
+            if not pid.isdigit():
+                continue
+
+            try:
+                with open(os.path.join(self.proc, pid, "comm")) as f:
+                    comm = f.read().strip()
+                with open(os.path.join(self.proc, pid, "cmdline"), "rb") as f:
+                    argv = f.read().decode(errors="replace").split("\0")[:-1]
+            except OSError:
+                # The process exited while we were looking at it
+                continue
+
+            names = {comm}
+            if argv:
+                exe = os.path.basename(argv[0])
+                names.add(exe)
+                if exe.rstrip("0123456789.") in self.interpreters:
+                    target = self._interpreted(argv[1:])
+                    if target:
+                        names.add(os.path.basename(target))
+
+            pid = int(pid)
+            self.cmdlines[pid] = argv
+            for name in names:
+                self.pids.setdefault(name, set()).add(pid)
+
+    @staticmethod
+    def _interpreted(args):
+        """The script or module an interpreter is running (if any)"""
+        args = iter(args)
+        for arg in args:
+            if arg == "-m":
+                return next(args, None)
+            if arg.startswith("-m"):
+                return arg[2:]
+            if arg == "-c":
+                # Inline code: there is no script to name it by
+                return None
+            if not arg.startswith("-"):
+                return arg
+
+        return None
+
+    def __contains__(self, name):
+        return name in self.pids
+
+    def find(self, name):
+        """The pids of processes with the given name"""
+        return self.pids.get(name, set())
+
+
+def wallpaper(fname, qtile=None):
+    """
+    Set the wallpaper to an image in my wallpaper directory.
+    NOTE :: This paints the root window from inside qtile (see wallpaper.py)
+            and falls back to feh.
+    """
+    from libqtile import hook
+    from wallpaper import set_wallpaper
+    return set_wallpaper(qtile or hook.qtile, WALLPAPER_DIR + fname)
 
 
 def script(fname):
@@ -31,48 +160,39 @@ def script(fname):
 
 
 def run_script(fname, with_output=False):
-    """Run a script from my scripts directory"""
+    """Run a script from my scripts directory (blocking)"""
     return run(script(fname), with_output=with_output)
 
 
+def run_script_async(fname, with_output=False, timeout=None):
+    """Run a script from my scripts directory without blocking"""
+    return run_async(
+        [script(fname)], with_output=with_output, timeout=timeout)
+
+
 def poll_func(script_name):
-    """Used in generating the status bar"""
+    """
+    Used in generating the status bar. Widget polls run in a worker thread
+    so this uses the blocking `run_script`.
+    """
     def poll():
         return run_script(script_name, with_output=True)
     return poll
 
 
-# XXX : Ah, looks like this is a thing already...!
 def ez_keys(key_bindings):
     """
     Simplify the declaration of key bindings:
         Before :: Key([mod, "shift"], "slash", lazy.layout.maximise())
         After  :: ("M-S-/", lazy.layout.maximise())
+    NOTE :: This is now just a wrapper around keytable.compile_keys.
     """
-    modifiers = {"M": "mod4", "A": "mod1", "S": "shift", "C": "control"}
-
-    special_chars = {
-        "/": "slash", "\\": "backslash", ";": "semicolon", "`": "grave",
-        "[": "bracketleft", "]": "bracketright", "Esc": "Escape",
-        ",": "comma", ".": "period", "-": "minus", "=": "equal",
-        "del": "Delete", "bckspc": "Backspace", "ret": "Return",
-        "'": "quoteleft", "#": "numbersign"
-    }
-
-    new_bindings = []
-
-    for spec, *actions in key_bindings:
-        # Only the last key is pressed, the rest are held as modifiers
-        *held, pressed = spec.split("-")
-        # Expand the shorthands
-        held = [modifiers.get(h, h) for h in held]
-        pressed = special_chars.get(pressed, pressed)
-        # Build the binding
-        new_bindings.append(Key(held, pressed, *actions))
-
-    return new_bindings
+    return list(compile_keys(key_bindings))
 
 
 def notify(msg):
-    """Send a notification. Used mainly for debugging config."""
-    run('notify-send "qtile" "%s"' % msg, with_output=False)
+    """
+    Send a notification. Used mainly for debugging config.
+    Repeated messages are dropped and bursts are batched (see notifications.py)
+    """
+    notifier.notify(msg)
@@ -0,0 +1,152 @@
+'''
+Compile emacs style key specs into qtile Keys, once.
+
+    ("M-S-<Return>", lazy.spawn("st")) :: M = mod4, A = mod1, S = shift,
+                                          C = control. <name> is an X keysym
+                                          name, otherwise single characters
+                                          (and the shorthands in SPECIAL)
+                                          are used as is.
+
+All of the specs are parsed and checked up front so that unknown modifiers,
+unknown keysyms and duplicate chords are reported when the config loads
+rather than when qtile tries to grab them.
+
+`apply_key_table` updates a running qtile from one table to another, only
+grabbing/ungrabbing the chords that have actually changed.
+'''
+from libqtile.config import Key
+from libqtile.xcbq import ModMasks
+from libqtile.xkeysyms import keysyms
+
+
+MODIFIERS = {'M': 'mod4', 'A': 'mod1', 'S': 'shift', 'C': 'control'}
+
+SPECIAL = {
+    '/': 'slash', '\\': 'backslash', ';': 'semicolon', '`': 'grave',
+    '[': 'bracketleft', ']': 'bracketright', 'Esc': 'Escape',
+    ',': 'comma', '.': 'period', '=': 'equal',
+    'del': 'Delete', 'bckspc': 'BackSpace', 'ret': 'Return',
+    "'": 'quoteleft', '#': 'numbersign',
+}
+
+
+class KeyBindingError(ValueError):
+    '''One or more key specs are invalid'''
+
+
+def parse_spec(spec):
+    '''
+    Parse a single spec into (modifiers, keysym name, modmask, keysym code).
+    Raises KeyBindingError if anything is unrecognised.
+    '''
+    # Only the last key is pressed, the rest are held as modifiers
+    *held, pressed = spec.split('-')
+
+    try:
+        modifiers = sorted(MODIFIERS[h] for h in held)
+    except KeyError as e:
+        raise KeyBindingError('%s: unknown modifier %s' % (spec, e))
+
+    if pressed.startswith('<') and pressed.endswith('>'):
+        name = pressed[1:-1]
+    else:
+        name = SPECIAL.get(pressed, pressed)
+
+    if name not in keysyms:
+        raise KeyBindingError('%s: unknown keysym %s' % (spec, name))
+
+    modmask = 0
+    for mod in modifiers:
+        modmask |= ModMasks[mod]
+
+    return modifiers, name, modmask, keysyms[name]
+
+
+def _parse_all(specs):
+    '''Parse every spec, reporting all of the problems at once'''
+    parsed, errors, seen = [], [], {}
+
+    for spec in specs:
+        try:
+            entry = parse_spec(spec)
+        except KeyBindingError as e:
+            errors.append(str(e))
+            continue
+
+        chord = (entry[2], entry[3])
+        if chord in seen:
+            errors.append('%s: duplicate of %s' % (spec, seen[chord]))
+        seen[chord] = spec
+        parsed.append(entry)
+
+    if errors:
+        raise KeyBindingError(
+            'Invalid key bindings:\n  ' + '\n  '.join(errors))
+
+    return parsed
+
+
+class KeyTable:
+    '''
+    The compiled key bindings: qtile Keys indexed by (modmask, keysym).
+    Tables are immutable and hash/compare on their chords and specs.
+    '''
+    def __init__(self, specs, parsed, keys):
+        self.specs = tuple(specs)
+        self.chords = tuple((p[2], p[3]) for p in parsed)
+        self._keys = tuple(keys)
+        self._by_chord = dict(zip(self.chords, self._keys))
+
+    def __getitem__(self, chord):
+        return self._by_chord[chord]
+
+    def __contains__(self, chord):
+        return chord in self._by_chord
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, KeyTable) and
+            (self.specs, self.chords) == (other.specs, other.chords)
+        )
+
+    def __hash__(self):
+        return hash((self.specs, self.chords))
+
+
+def compile_keys(bindings):
+    '''Build a KeyTable from a list of (spec, *actions) tuples'''
+    specs = [b[0] for b in bindings]
+    parsed = _parse_all(specs)
+
+    keys = [
+        Key(list(modifiers), name, *actions)
+        for (modifiers, name, _, _), (_, *actions) in zip(parsed, bindings)
+    ]
+
+    return KeyTable(specs, parsed, keys)
+
+
+def apply_key_table(qtile, old, new):
+    '''
+    Switch a running qtile from one table to another. Chords that exist in
+    both just have their actions swapped, so only added and removed chords
+    touch the X server.
+    '''
+    for chord in old.chords:
+        if chord not in new:
+            qtile.unmapKey(old[chord])
+
+    for chord in new.chords:
+        key = new[chord]
+        if chord in old:
+            qtile.keyMap[(key.keysym, key.modmask & qtile.validMask)] = key
+        else:
+            qtile.mapKey(key)
+
+    qtile.config.keys = list(new)
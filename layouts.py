@@ -14,6 +14,8 @@ Look at porting some Xmonad layouts to qtile:
 from settings import COLS, FONT_PARAMS
 from libqtile import layout
 
+import xcffib.xproto
+
 
 # Annoyingly, there isn't a common subset of parameters for all layouts that
 # can be passed as a dict splat. There _are_ some common ones for multiple
@@ -26,7 +28,110 @@ BORDER_WIDTH = 3
 MARGIN = 10
 
 
-layouts = [
+class LazyLayout:
+    '''
+    Stand in for a layout that is only cloned for a group when it is used.
+
+    qtile clones every layout into every group when it starts and then adds
+    every window to every layout in the group. Until a group actually uses
+    the layout we just keep track of the windows (and which was focused) and
+    replay them onto a real clone on first use. Anything other than
+    add/remove/focus/blur/hide is passed through to the real layout, creating
+    it if needed.
+
+    Once the group is empty the clone is dropped again: straight away if it
+    isn't the group's current layout, otherwise when the group is hidden.
+    '''
+    _own = ('_template', '_group', '_layout', '_clients', '_focused')
+
+    def __init__(self, template, group=None):
+        self._template = template
+        self._group = group
+        self._layout = None
+        self._clients = []
+        self._focused = None
+        self.name = template.name
+
+    def __repr__(self):
+        state = 'live' if self._layout is not None else 'lazy'
+        return '<LazyLayout %s (%s)>' % (self.name, state)
+
+    # NOTE :: Some widgets (CurrentLayoutIcon) name layouts by their class
+    #         and isinstance checks should see the real layout.
+    @property
+    def __class__(self):
+        return self._template.__class__
+
+    def __getattr__(self, name):
+        # Only called for attributes that we don't define ourselves
+        if name.startswith('__') or name in LazyLayout._own:
+            raise AttributeError(name)
+
+        return getattr(self._materialise(), name)
+
+    def _materialise(self):
+        if self._layout is None:
+            self._layout = self._template.clone(self._group)
+            for client in self._clients:
+                self._layout.add(client)
+            if self._focused in self._clients:
+                self._layout.focus(self._focused)
+
+        return self._layout
+
+    def _release(self):
+        if self._layout is not None:
+            self._layout.finalize()
+            self._layout = None
+        self._focused = None
+
+    def _is_current(self):
+        return self._group is not None and self._group.layout is self
+
+    def clone(self, group):
+        return LazyLayout(self._template, group)
+
+    def add(self, client):
+        self._clients.append(client)
+        if self._layout is not None:
+            self._layout.add(client)
+
+    def remove(self, client):
+        if client in self._clients:
+            self._clients.remove(client)
+        if self._focused is client:
+            self._focused = None
+
+        if self._layout is None:
+            return None
+
+        next_focus = self._layout.remove(client)
+        if not self._clients and not self._is_current():
+            self._release()
+
+        return next_focus
+
+    def focus(self, client):
+        self._focused = client
+        if self._layout is not None:
+            self._layout.focus(client)
+
+    def blur(self):
+        # qtile blurs every layout in the group when a floating window gets
+        # focus: that shouldn't be enough to create them
+        if self._layout is not None:
+            self._layout.blur()
+
+    def hide(self):
+        if self._layout is None:
+            return
+
+        self._layout.hide()
+        if not self._clients:
+            self._release()
+
+
+layouts = [LazyLayout(template) for template in [
     # XXX : Emulating BSPWM (but not matching it) setting fair=False will
     #       cause
     layout.Bsp(
@@ -94,11 +199,73 @@ layouts = [
     #     margin=MARGIN,
     #     ratio=2.5
     # ),
-]
+]]
+
+
+class FloatRules:
+    '''
+    The `float_rules` for the floating layout compiled into a single lookup.
+
+    qtile checks each rule in turn against every new window. Here, the
+    values are collected into a set per property (wname, wmclass, role) so
+    the cost of a lookup doesn't depend on how many rules there are.
+    NOTE :: Like Window.match, values are compared for equality so only
+            strings are accepted.
+    '''
+    properties = ('wname', 'wmclass', 'role')
+
+    def __init__(self, rules):
+        self.exact = {p: set() for p in self.properties}
+
+        for rule in rules:
+            for prop, value in rule.items():
+                if prop not in self.exact:
+                    raise ValueError('Unknown float rule property: %s' % prop)
+                if not isinstance(value, str):
+                    raise ValueError(
+                        'Float rule values must be strings: %r' % (value,))
+
+                self.exact[prop].add(value)
+
+    def _check(self, prop, values):
+        exact = self.exact[prop]
+        return any(value in exact for value in values)
+
+    def match(self, win):
+        '''Same semantics as Window.match: any property matching is enough'''
+        if win.name and self._check('wname', (win.name,)):
+            return True
+
+        try:
+            wm_class = win.window.get_wm_class()
+            if wm_class and self._check('wmclass', wm_class):
+                return True
+
+            role = win.window.get_wm_window_role()
+            if role and self._check('role', (role,)):
+                return True
+        except (xcffib.xproto.WindowError, xcffib.xproto.AccessError):
+            return False
+
+        return False
+
+
+class CompiledFloating(layout.Floating):
+    '''Floating layout that matches `float_rules` using FloatRules'''
+    def __init__(self, float_rules=None, **config):
+        layout.Floating.__init__(self, float_rules=float_rules, **config)
+        self.compiled_rules = FloatRules(self.float_rules)
+
+    def match(self, win):
+        if win.window.get_wm_type() in self.auto_float_types:
+            return True
+
+        return self.compiled_rules.match(win)
+
 
 # Specification for auto floating windows: this isn't a layout in the same
 # way as the ones listed above.
-floating_layout = layout.Floating(
+floating_layout = CompiledFloating(
     border_normal=BORDER_NORMAL,
     border_focus=BORDER_FOCUS,
     border_width=BORDER_WIDTH,
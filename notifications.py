@@ -0,0 +1,133 @@
+'''
+Rate limited desktop notifications.
+
+`helpers.notify` used to fork `notify-send` for every message, which gets out
+of hand when an error path fires repeatedly. Messages now go through a
+Notifier that:
+    - drops messages identical to one sent in the last `dedupe_window` secs
+    - collects messages for `batch_window` secs and sends a burst of them as
+      a single summary notification
+
+Notifications are delivered using the first backend that is available:
+    - A unix datagram socket named by $QTILE_NOTIFY_SOCKET (for testing).
+    - A persistent D-Bus connection to org.freedesktop.Notifications (needs
+      dbus-python).
+    - `notify-send` as a last resort.
+'''
+import asyncio
+import json
+import os
+import socket
+import time
+
+from libqtile.log_utils import logger
+
+from settings import NOTIFY_BATCH_WINDOW, NOTIFY_DEDUPE_WINDOW
+
+try:
+    import dbus
+except ImportError:
+    dbus = None
+
+
+class SocketBackend:
+    '''Send notifications as JSON datagrams to a local socket'''
+    def __init__(self, path):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def send(self, title, body):
+        msg = json.dumps({'title': title, 'body': body}).encode()
+        self.sock.sendto(msg, self.path)
+
+
+class DBusBackend:
+    '''Talk to the notification daemon over a single D-Bus connection'''
+    def __init__(self):
+        bus = dbus.SessionBus()
+        obj = bus.get_object(
+            'org.freedesktop.Notifications', '/org/freedesktop/Notifications')
+        self.iface = dbus.Interface(obj, 'org.freedesktop.Notifications')
+
+    def send(self, title, body):
+        self.iface.Notify(
+            'qtile', 0, '', title, body, [], {}, -1, ignore_reply=True)
+
+
+class NotifySendBackend:
+    '''Fork notify-send (without blocking the event loop)'''
+    def send(self, title, body):
+        from helpers import run_async
+        run_async(['notify-send', title, body])
+
+
+def default_backend():
+    path = os.environ.get('QTILE_NOTIFY_SOCKET')
+    if path:
+        return SocketBackend(path)
+
+    if dbus is not None:
+        try:
+            return DBusBackend()
+        except dbus.DBusException:
+            logger.exception('Unable to connect to the notification daemon')
+
+    return NotifySendBackend()
+
+
+class Notifier:
+    '''Deduplicate and batch notifications before sending them'''
+    def __init__(self, backend=None, dedupe_window=NOTIFY_DEDUPE_WINDOW,
+                 batch_window=NOTIFY_BATCH_WINDOW):
+        self._backend = backend
+        self.dedupe_window = dedupe_window
+        self.batch_window = batch_window
+        self._recent = {}
+        self._pending = []
+        self._handle = None
+
+    @property
+    def backend(self):
+        # Connect lazily so that importing the config doesn't touch D-Bus
+        if self._backend is None:
+            self._backend = default_backend()
+        return self._backend
+
+    def notify(self, msg, title='qtile', loop=None):
+        now = time.monotonic()
+        last = self._recent.get((title, msg))
+        if last is not None and now - last < self.dedupe_window:
+            return
+
+        self._recent[(title, msg)] = now
+        self._pending.append((title, msg))
+
+        if self._handle is None:
+            loop = loop or asyncio.get_event_loop()
+            self._handle = loop.call_later(self.batch_window, self.flush)
+
+    def flush(self):
+        '''Send everything that is pending'''
+        self._handle = None
+        pending, self._pending = self._pending, []
+
+        if len(pending) == 1:
+            title, body = pending[0]
+        elif pending:
+            title = 'qtile (%d messages)' % len(pending)
+            body = '\n'.join('%s: %s' % p for p in pending)
+        else:
+            return
+
+        try:
+            self.backend.send(title, body)
+        except Exception:
+            logger.exception('Unable to send notification: %s', body)
+
+        # Don't let the dedupe history grow forever
+        cutoff = time.monotonic() - self.dedupe_window
+        self._recent = {k: t for k, t in self._recent.items() if t > cutoff}
+
+
+notifier = Notifier()
@@ -0,0 +1,176 @@
+'''
+Shared polling for my status bar widgets.
+
+Every screen gets its own bar (see `make_screen` in config.py) but the widgets
+on each bar are showing exactly the same thing. Rather than have each widget
+run its own timer and poll independently, widgets subscribe to a process wide
+scheduler that polls once per key and fans the result out to every widget
+that is interested in it.
+
+Timers are aligned to multiples of their interval on the wall clock so that
+polls sharing an interval (or a multiple of it) wake up together.
+
+The polls themselves run on a small shared pool of worker threads so that the
+number of threads doesn't grow with the number of bars.
+'''
+import functools
+import queue
+import threading
+import time
+
+from libqtile.log_utils import logger
+
+from settings import POLL_WORKERS
+
+
+class WorkerPool:
+    '''
+    A fixed number of worker threads pulling jobs off a shared queue. Jobs are
+    keyed and a job is dropped if the same key is already queued or running.
+
+    Jobs are responsible for enforcing their own timeouts (ShellScript passes
+    a timeout to subprocess.run which kills the script if it hangs) so that a
+    stuck job only holds up a worker for a bounded amount of time.
+    '''
+    def __init__(self, size):
+        self.size = size
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, key, func, callback):
+        '''
+        Queue `func` to run on a worker and pass its result to `callback`
+        (from the worker thread). Returns False if the job was dropped.
+        '''
+        with self._lock:
+            if key in self._pending:
+                return False
+
+            self._pending.add(key)
+            self._start_workers()
+
+        self._queue.put((key, func, callback))
+        return True
+
+    def _start_workers(self):
+        while len(self._threads) < self.size:
+            worker = threading.Thread(
+                target=self._work, name='poll-worker-%d' % len(self._threads))
+            worker.daemon = True
+            worker.start()
+            self._threads.append(worker)
+
+    def _work(self):
+        while True:
+            key, func, callback = self._queue.get()
+            result = None
+            try:
+                result = func()
+            except Exception:
+                logger.exception('Problem polling %s', key)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+            try:
+                callback(result)
+            except Exception:
+                logger.exception('Problem delivering result for %s', key)
+
+
+class _Entry:
+    '''Book keeping for a single poll key'''
+    def __init__(self, key, interval, qtile):
+        self.key = key
+        self.interval = interval
+        self.qtile = qtile
+        self.subscribers = []
+        self.handle = None
+        self.last = None
+
+
+class PollScheduler:
+    '''
+    Run each poll function once per tick, no matter how many widgets are
+    displaying its output.
+    '''
+    def __init__(self, pool):
+        self.pool = pool
+        self._entries = {}
+
+    def subscribe(self, widget, key, interval, poll_now=True):
+        '''
+        Start delivering the result of `widget.poll` to `widget.update`. The
+        first widget to subscribe for a given key is the one that gets polled.
+        If `poll_now` is False the first poll waits for the next tick.
+        '''
+        entry = self._entries.get(key)
+
+        if entry is None:
+            entry = self._entries[key] = _Entry(key, interval, widget.qtile)
+            entry.subscribers.append(widget)
+            self._schedule(entry)
+            if poll_now:
+                self._run(entry)
+        else:
+            entry.subscribers.append(widget)
+            if entry.last is not None:
+                widget.update(entry.last)
+
+    def unsubscribe(self, widget, key):
+        '''Stop delivering updates to a widget'''
+        entry = self._entries.get(key)
+        if entry is None or widget not in entry.subscribers:
+            return
+
+        entry.subscribers.remove(widget)
+        if not entry.subscribers:
+            if entry.handle is not None:
+                entry.handle.cancel()
+            del self._entries[key]
+
+    def poll_now(self, key):
+        '''Poll immediately rather than waiting for the next tick'''
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._run(entry)
+
+    def _schedule(self, entry, delay=None):
+        if entry.interval is None:
+            return
+
+        if delay is None:
+            delay = entry.interval - (time.time() % entry.interval)
+
+        entry.handle = entry.qtile.call_later(delay, self._tick, entry)
+
+    def _tick(self, entry):
+        self._schedule(entry)
+        self._run(entry)
+
+    def _run(self, entry):
+        if not entry.subscribers:
+            return
+
+        self.pool.submit(
+            entry.key,
+            entry.subscribers[0].poll,
+            functools.partial(self._delivered, entry),
+        )
+
+    def _delivered(self, entry, text):
+        '''Runs in a worker thread: hop back on to the event loop'''
+        entry.qtile.call_soon_threadsafe(self._deliver, entry, text)
+
+    def _deliver(self, entry, text):
+        if text is None:
+            return
+
+        entry.last = text
+        for widget in list(entry.subscribers):
+            widget.update(text)
+
+
+scheduler = PollScheduler(WorkerPool(POLL_WORKERS))
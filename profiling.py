@@ -0,0 +1,155 @@
+'''
+Opt in profiling of config load, hooks and widget start up.
+
+Enable by setting `PROFILE = True` in settings.py or by starting qtile with
+QTILE_PROFILE=1 in the environment. Each timed event is appended as a line of
+JSON to ~/.cache/qtile/profile.jsonl:
+    phase       :: a block of config load (module imports etc)
+    call        :: a hook or function call (make_screen, autostart...)
+    first_paint :: seconds from config load until a widget was first drawn
+    first_update:: seconds from config load until a widget first got text
+
+To see where the time went in the most recent start/restart:
+    $ python3 profiling.py [-n 20] [--all] [log file]
+'''
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+
+from settings import CACHE_DIR, PROFILE
+
+
+# This module is imported first thing in config.py so this is (close enough
+# to) the point that config load started.
+T0 = time.monotonic()
+ENABLED = PROFILE or bool(os.environ.get('QTILE_PROFILE'))
+LOG_FILE = os.path.join(CACHE_DIR, 'profile.jsonl')
+RUN_ID = '%d-%d' % (time.time(), os.getpid())
+
+
+def record(kind, name, duration):
+    '''Append an event to the log file'''
+    if not ENABLED:
+        return
+
+    entry = {
+        'run': RUN_ID,
+        'kind': kind,
+        'name': name,
+        'duration': duration,
+        'since_start': time.monotonic() - T0,
+    }
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(LOG_FILE, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def phase(name):
+    '''Time a block of code'''
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record('phase', name, time.monotonic() - start)
+
+
+def timed(func):
+    '''Time every call to a function (use underneath hook.subscribe)'''
+    if not ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def _inner(*args, **kwargs):
+        start = time.monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record('call', func.__name__, time.monotonic() - start)
+
+    return _inner
+
+
+def _first_call(widget, method, kind):
+    '''Record the first time that `method` is called on a widget'''
+    original = getattr(widget, method)
+
+    def _inner(*args, **kwargs):
+        # Remove the instance attribute to restore the normal method
+        delattr(widget, method)
+        record(kind, widget.name, time.monotonic() - T0)
+        return original(*args, **kwargs)
+
+    setattr(widget, method, _inner)
+
+
+def track_first_paint(widget):
+    '''Record when a widget is first drawn and (if it polls) first updated'''
+    if not ENABLED:
+        return widget
+
+    _first_call(widget, 'draw', 'first_paint')
+    if hasattr(widget, 'update'):
+        _first_call(widget, 'update', 'first_update')
+
+    return widget
+
+
+def report(path=LOG_FILE, limit=20, all_runs=False):
+    '''Rank the slowest contributors to start up time'''
+    try:
+        with open(path) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        # Nothing has been timed yet
+        events = []
+
+    if not events:
+        return 'No profiling data in %s' % path
+
+    if not all_runs:
+        last_run = events[-1]['run']
+        events = [e for e in events if e['run'] == last_run]
+
+    totals = {}
+    for e in events:
+        # First paint/update are points in time rather than durations
+        if e['kind'].startswith('first_'):
+            value = e['since_start']
+        else:
+            value = e['duration']
+
+        key = (e['kind'], e['name'])
+        count, total = totals.get(key, (0, 0.0))
+        totals[key] = (count + 1, total + value)
+
+    ranked = sorted(totals.items(), key=lambda kv: kv[1][1], reverse=True)
+    lines = ['%-13s %-40s %5s %10s' % ('kind', 'name', 'count', 'ms')]
+    for (kind, name), (count, total) in ranked[:limit]:
+        lines.append('%-13s %-40s %5d %10.1f' % (
+            kind, name[:40], count, total * 1000))
+
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    limit, all_runs, path = 20, False, LOG_FILE
+
+    while args:
+        arg = args.pop(0)
+        if arg == '-n':
+            limit = int(args.pop(0))
+        elif arg == '--all':
+            all_runs = True
+        else:
+            path = arg
+
+    print(report(path, limit=limit, all_runs=all_runs))
@@ -0,0 +1,218 @@
+'''
+A single sampler for system metrics shared by all of the bar widgets.
+
+The CPU, memory and network graphs (on every screen) along with the bandwidth
+collector all want numbers from the same handful of files in /proc. Rather
+than each of them reading for themselves, the sampler reads /proc/stat,
+/proc/meminfo and /proc/net/dev at most once per tick and keeps the results
+in array backed ring buffers that everything reads from.
+
+Ticks are multiples of the caller's interval on the wall clock (the graphs
+pass their `frequency`) so widgets whose timers aren't in phase still share
+a sample: the first to refresh in a tick reads /proc, the rest reuse it.
+
+The buffers are written by whichever thread calls `refresh` (the bar on the
+event loop or a poll worker) so all reads and writes go through `_lock`: use
+the reader methods here rather than indexing the buffers directly.
+'''
+import threading
+import time
+from array import array
+
+
+# Number of samples to keep for each metric
+HISTORY = 60
+
+# Guards every RingBuffer owned by the sampler
+_lock = threading.RLock()
+
+
+class RingBuffer:
+    '''
+    A fixed number of the most recent values, stored in a flat array so that
+    long histories stay compact. Indexing and iteration go oldest to newest.
+    '''
+    def __init__(self, size, typecode='d'):
+        self.size = size
+        self._data = array(typecode, [0]) * size
+        self._next = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('RingBuffer index out of range')
+
+        start = self._next - self._count
+        return self._data[(start + index) % self.size]
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+
+class InterfaceRates:
+    '''
+    Byte counters for an interface sampled against the monotonic clock. Rates
+    are computed between samples so they aren't limited to one second
+    resolution.
+    '''
+    def __init__(self, size):
+        self.times = RingBuffer(size)
+        self.rx = RingBuffer(size)
+        self.tx = RingBuffer(size)
+
+    def sample(self, rx, tx, now=None):
+        self.times.append(time.monotonic() if now is None else now)
+        self.rx.append(rx)
+        self.tx.append(tx)
+
+    def latest(self):
+        '''The most recent (time, rx bytes, tx bytes) or None'''
+        with _lock:
+            if not len(self.times):
+                return None
+            return self.times[-1], self.rx[-1], self.tx[-1]
+
+    def rates(self, window=1):
+        '''Average (rx, tx) bytes/sec over the last `window` intervals'''
+        with _lock:
+            return self._rates(window)
+
+    def _rates(self, window):
+        window = min(window, len(self.times) - 1)
+        if window < 1:
+            return None
+
+        elapsed = self.times[-1] - self.times[-1 - window]
+        if elapsed <= 0:
+            return None
+
+        # Counters go backwards if the interface is reset
+        rx = max(self.rx[-1] - self.rx[-1 - window], 0)
+        tx = max(self.tx[-1] - self.tx[-1 - window], 0)
+        return rx / elapsed, tx / elapsed
+
+    def history(self):
+        '''(time, rx bytes/sec, tx bytes/sec) for each sampled interval'''
+        with _lock:
+            samples = list(zip(self.times, self.rx, self.tx))
+        return [
+            (t1, max(rx1 - rx0, 0) / (t1 - t0), max(tx1 - tx0, 0) / (t1 - t0))
+            for (t0, rx0, tx0), (t1, rx1, tx1) in zip(samples, samples[1:])
+            if t1 > t0
+        ]
+
+    def peak(self):
+        '''Highest (rx, tx) bytes/sec over the history'''
+        history = self.history()
+        if not history:
+            return None
+
+        return max(h[1] for h in history), max(h[2] for h in history)
+
+
+# Sample history for each interface: shared so that graphs can reuse it
+_rates = {}
+
+
+def interface_rates(interface, size=HISTORY):
+    '''The sampled history for an interface'''
+    rates = _rates.get(interface)
+    if rates is None:
+        rates = _rates[interface] = InterfaceRates(size)
+
+    return rates
+
+
+class SystemSampler:
+    '''
+    Reads the kernel's counters once per tick. Call `refresh` before reading
+    the buffers: it only hits /proc if there hasn't been a sample since the
+    start of the current tick, so it is safe (and cheap) for every widget to
+    call it.
+    '''
+    def __init__(self, interval=1, size=HISTORY):
+        self.interval = interval
+        self.size = size
+        # Percentage of time the CPUs (all cores) were busy
+        self.cpu = RingBuffer(size)
+        # Memory in use and total memory (kB)
+        self.mem_used = RingBuffer(size)
+        self.mem_total = 0
+        self._cpu_prev = None
+        self._last = None
+        self._lock = _lock
+
+    def refresh(self, interval=None):
+        '''Sample /proc unless we already have for this `interval` tick'''
+        interval = interval or self.interval
+        with self._lock:
+            wall = time.time()
+            if self._last is not None and self._last >= wall - wall % interval:
+                return
+
+            self._last = wall
+            self._sample_cpu()
+            self._sample_mem()
+            self._sample_net(time.monotonic())
+
+    def latest(self):
+        '''(cpu %, memory used kB, memory total kB) from the last sample'''
+        with self._lock:
+            cpu = self.cpu[-1] if len(self.cpu) else None
+            mem_used = self.mem_used[-1] if len(self.mem_used) else None
+            return cpu, mem_used, self.mem_total
+
+    def _sample_cpu(self):
+        with open('/proc/stat') as f:
+            fields = f.readline().split()
+
+        user, nice, system, idle = (int(v) for v in fields[1:5])
+        busy_total = (user + nice + system, user + nice + system + idle)
+
+        if self._cpu_prev is not None:
+            busy = busy_total[0] - self._cpu_prev[0]
+            total = busy_total[1] - self._cpu_prev[1]
+            if total:
+                self.cpu.append(busy * 100.0 / total)
+            elif len(self.cpu):
+                # No ticks since the last sample: repeat the last value
+                self.cpu.append(self.cpu[-1])
+
+        self._cpu_prev = busy_total
+
+    def _sample_mem(self):
+        info = {}
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                info[key] = int(value.split()[0])
+
+        self.mem_total = info['MemTotal']
+        self.mem_used.append(
+            info['MemTotal'] - info['MemFree'] -
+            info.get('Buffers', 0) - info.get('Cached', 0)
+        )
+
+    def _sample_net(self, now):
+        with open('/proc/net/dev') as f:
+            lines = f.readlines()[2:]
+
+        for line in lines:
+            interface, stats = line.split(':', 1)
+            stats = stats.split()
+            interface_rates(interface.strip(), self.size).sample(
+                int(stats[0]), int(stats[8]), now=now)
+
+
+system_sampler = SystemSampler()
@@ -0,0 +1,72 @@
+'''
+Book keeping for windows that have been sent to the scratchpad.
+
+Rather than scanning every window in a group to find scratchpad windows, we
+keep an index of them by the group that they are currently on. Hiding the
+scratchpad windows on a group is then proportional to the number of
+scratchpad windows, not the number of windows.
+
+The index is updated whenever we move a scratchpad window ourselves. A window
+can also be moved by something else (M-S-<n> for example) without any hook
+telling us, so before each lookup every tracked window is checked against the
+group it is actually on and re-filed if it has moved. There are only ever a
+handful of scratchpad windows so this is cheap.
+'''
+SCRATCHPAD = 'scratchpad'
+
+
+class ScratchpadRegistry:
+    '''Scratchpad windows indexed by the name of the group they are on'''
+    def __init__(self):
+        self._by_group = {}
+        self._location = {}
+
+    def __contains__(self, window):
+        return window in self._location
+
+    def __len__(self):
+        return len(self._location)
+
+    def add(self, window):
+        '''Mark a window as being a scratchpad window'''
+        group = window.group.name if window.group else SCRATCHPAD
+        self.moved(window, group)
+
+    def moved(self, window, group_name):
+        '''Record that a scratchpad window is now on `group_name`'''
+        old = self._location.get(window)
+        if old is not None:
+            self._by_group[old].pop(window, None)
+
+        self._location[window] = group_name
+        # dicts keep insertion order so this doubles as an ordered set
+        self._by_group.setdefault(group_name, {})[window] = None
+
+    def forget(self, window):
+        '''Drop a window (i.e. when it is killed)'''
+        old = self._location.pop(window, None)
+        if old is not None:
+            self._by_group[old].pop(window, None)
+
+    def _reconcile(self):
+        '''Re-file any windows that have been moved behind our back'''
+        for window, recorded in list(self._location.items()):
+            actual = window.group.name if window.group else None
+            if actual is None:
+                self.forget(window)
+            elif actual != recorded:
+                self.moved(window, actual)
+
+    def on_group(self, group_name):
+        '''The scratchpad windows that are currently on a group'''
+        self._reconcile()
+        return list(self._by_group.get(group_name, ()))
+
+    def hide(self, group_name):
+        '''Send any scratchpad windows on a group back to the scratchpad'''
+        for window in self.on_group(group_name):
+            window.togroup(SCRATCHPAD)
+            self.moved(window, SCRATCHPAD)
+
+
+registry = ScratchpadRegistry()
@@ -0,0 +1,180 @@
+'''
+Handle monitors being added and removed without restarting qtile.
+
+When the outputs change we work out the new layout of the monitors and compare
+it against the screens we already have:
+    - Screens that still exist are resized in place. Their bar windows are
+      destroyed first so that qtile creates fresh ones at the new size, but
+      the widgets are left running (qtile only starts their timers once).
+    - New outputs get a fresh Screen (and bar) from `make_screen`.
+    - Screens that have gone away have their bars torn down and their group
+      hidden. If the focused screen goes away, focus and its group move to
+      the first remaining screen so that we aren't left typing into a
+      monitor that no longer exists.
+
+Docking and undocking generates a burst of screen_change events so they are
+debounced: we wait for things to go quiet and then act once on the final
+layout of the outputs.
+'''
+from libqtile.log_utils import logger
+from libqtile.scratchpad import ScratchPad
+
+
+def query_outputs(conn):
+    '''
+    The current (x, y, width, height) of each output. xcbq only looks these
+    up when qtile starts so we need to ask X directly.
+    '''
+    # NOTE :: xcbq only sets `xinerama` if the server has the extension
+    #         (`extensions` is a method in newer versions of qtile)
+    if hasattr(conn, 'xinerama'):
+        return [
+            (s.x_org, s.y_org, s.width, s.height)
+            for s in conn.xinerama.query_screens()
+        ]
+
+    return [(s.x, s.y, s.width, s.height) for s in conn.pseudoscreens]
+
+
+def topology(qtile):
+    '''
+    The geometry of each distinct output, in the order that X gives them to
+    us. Outputs sharing an origin (mirrored displays) are merged in the same
+    way that qtile does it when it starts up.
+    '''
+    sizes = {}
+    order = []
+
+    for x, y, width, height in query_outputs(qtile.conn):
+        w, h = sizes.get((x, y), (0, 0))
+        if (x, y) not in sizes:
+            order.append((x, y))
+        sizes[(x, y)] = (max(w, width), max(h, height))
+
+    return [(x, y) + sizes[(x, y)] for x, y in order]
+
+
+def _free_group(qtile):
+    '''The first group that isn't currently being shown on a screen'''
+    for group in qtile.groups:
+        if group.screen is None and not isinstance(group, ScratchPad):
+            return group
+
+    return None
+
+
+def _destroy_bar_windows(qtile, screen):
+    '''
+    Destroy the windows (and drawers) of the bars on a screen. The widgets
+    are left alone: configuring the screen again creates new bar windows
+    and hands them a new drawer.
+    '''
+    for gap in screen.gaps:
+        window = getattr(gap, 'window', None)
+        if window is None:
+            continue
+
+        gap.finalize()
+        qtile.windowMap.pop(window.window.wid, None)
+        window.kill()
+        gap.window = None
+
+
+def _teardown_bars(qtile, screen):
+    '''
+    Finalise all of the widgets on a screen and destroy their bar windows.
+    Finalised widgets stop polling for good so this is only for screens
+    that are going away.
+    '''
+    for gap in screen.gaps:
+        for widget in getattr(gap, 'widgets', []):
+            widget.finalize()
+            if qtile.widgetMap.get(widget.name) is widget:
+                del qtile.widgetMap[widget.name]
+
+    _destroy_bar_windows(qtile, screen)
+
+
+def reconfigure_screens(qtile, screens, make_screen):
+    '''
+    Bring qtile's screens in line with the attached outputs. `screens` is the
+    list from config.py which is kept in sync so that a later restart sees
+    the same screens.
+    '''
+    outputs = topology(qtile)
+    if not outputs:
+        logger.warning('No outputs found: leaving screens alone')
+        return
+
+    keep = qtile.screens[:len(outputs)]
+    removed = qtile.screens[len(outputs):]
+
+    # Resize the screens that are still attached. Screen.resize configures
+    # the bars again, which creates new bar windows, so the old ones have to
+    # go first or they are left mapped at the old size. The widgets must not
+    # be finalised: configuring them again doesn't restart their timers.
+    for screen, (x, y, width, height) in zip(keep, outputs):
+        if (screen.x, screen.y, screen.width, screen.height) != (
+                x, y, width, height):
+            _destroy_bar_windows(qtile, screen)
+            screen.resize(x, y, width, height)
+
+    # Tear down screens for outputs that have been removed
+    for screen in removed:
+        group = screen.group
+        focused = qtile.currentScreen is screen
+        _teardown_bars(qtile, screen)
+        group.setScreen(None)
+
+        if focused:
+            qtile.currentScreen = keep[0]
+            keep[0].setGroup(group)
+
+    # Create screens for outputs that have been added
+    for index in range(len(keep), len(outputs)):
+        x, y, width, height = outputs[index]
+        group = _free_group(qtile)
+        if group is None:
+            logger.warning('No free group for new screen %d', index)
+            break
+
+        screen = make_screen()
+        screen._configure(qtile, index, x, y, width, height, group)
+        keep.append(screen)
+
+    qtile.screens[:] = keep
+    screens[:] = keep
+
+
+class ScreenChangeDebouncer:
+    '''
+    Collect screen_change events and only reconfigure once they have stopped
+    arriving for `delay` seconds. Nothing is done if the outputs end up
+    matching the screens that we already have.
+    '''
+    def __init__(self, callback, delay):
+        self.callback = callback
+        self.delay = delay
+        self._handle = None
+
+    def __call__(self, qtile):
+        if self._handle is not None:
+            self._handle.cancel()
+
+        self._handle = qtile.call_later(self.delay, self._settled, qtile)
+
+    def _settled(self, qtile):
+        self._handle = None
+        try:
+            outputs = topology(qtile)
+            current = [
+                (s.x, s.y, s.width, s.height) for s in qtile.screens
+            ]
+            changed = outputs != current
+        except Exception:
+            # Let the callback deal with it (it can always restart qtile)
+            logger.exception('Unable to compare outputs with screens')
+            changed = True
+
+        if changed:
+            self.callback(qtile)
@@ -87,6 +87,38 @@ FONT_PARAMS = {
 SCRIPT_DIR = os.path.expanduser('~/bin/scripts/')
 ACME_SCRIPT_DIR = os.path.expanduser('~/Personal/acme-corp/scripts/')
 
+# Number of threads shared by all ShellScript widgets for polling and the
+# number of seconds a script can run for before it is killed.
+POLL_WORKERS = 2
+POLL_TIMEOUT = 30
+
+# Seconds to wait for randr events to settle before reconfiguring screens
+SCREEN_CHANGE_DELAY = 0.5
+
+# Widgets to show on the bars of any additional monitors (see make_screen in
+# config.py): "full" duplicates the main bar, "minimal" drops the graphs and
+# script widgets.
+SECONDARY_SCREEN_PROFILE = "minimal"
+
+# Wallpaper (see wallpaper.py): scaled copies are cached in CACHE_DIR
+WALLPAPER_DIR = os.path.expanduser('~/Pictures/Wallpapers/')
+WALLPAPER = WALLPAPER_DIR + 'river-boat.jpg'
+
+# Number of pango layouts each ShellScript keeps for recent outputs
+LAYOUT_CACHE_SIZE = 16
+
+# Location for any state that we want to persist between restarts
+CACHE_DIR = os.path.expanduser('~/.cache/qtile/')
+
+# Notifications: identical messages within the dedupe window are dropped
+# and bursts within the batch window are sent as a single summary.
+NOTIFY_DEDUPE_WINDOW = 10
+NOTIFY_BATCH_WINDOW = 0.5
+
+# Log timings for config load, hooks and widget start up to CACHE_DIR
+# (see profiling.py for the report). QTILE_PROFILE=1 also enables this.
+PROFILE = False
+
 # Whether or not the primary monitor should spawn a systray
 # NOTE :: When embedding qtile inside of another desktop environment (such
 #         as mate) this should be `False` as the DE systray and qtile's
@@ -0,0 +1,98 @@
+'''
+Tests for LazyLayout: layouts should only be created for a group when the
+group actually uses them.
+'''
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('libqtile')
+pytest.importorskip('xcffib')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from layouts import LazyLayout  # noqa: E402
+
+
+class Template:
+    '''Records clones and the calls made on them'''
+    def __init__(self):
+        self.name = 'template'
+        self.clones = []
+        self.calls = []
+
+    def clone(self, group):
+        self.clones.append(group)
+        return self
+
+    def add(self, client):
+        self.calls.append(('add', client))
+
+    def remove(self, client):
+        self.calls.append(('remove', client))
+
+    def focus(self, client):
+        self.calls.append(('focus', client))
+
+    def blur(self):
+        self.calls.append(('blur',))
+
+    def hide(self):
+        self.calls.append(('hide',))
+
+    def finalize(self):
+        self.calls.append(('finalize',))
+
+    def info(self):
+        return {'name': self.name}
+
+
+class Group:
+    def __init__(self, layouts):
+        self.layouts = [layout.clone(self) for layout in layouts]
+        self.layout = self.layouts[0]
+
+
+def test_blur_does_not_create_the_layout():
+    template = Template()
+    group = Group([LazyLayout(Template()), LazyLayout(template)])
+
+    # What qtile does when a floating window in the group gets focus
+    for layout in group.layouts:
+        layout.blur()
+
+    assert template.clones == []
+
+
+def test_blur_is_passed_on_once_created():
+    template = Template()
+    layout = LazyLayout(template).clone(None)
+    layout.info()
+
+    layout.blur()
+    assert template.calls[-1] == ('blur',)
+
+
+def test_clients_are_replayed_on_first_use():
+    template = Template()
+    layout = LazyLayout(template).clone('group')
+    layout.add('a')
+    layout.add('b')
+    layout.focus('a')
+    assert template.clones == []
+
+    assert layout.info() == {'name': 'template'}
+    assert template.clones == ['group']
+    assert template.calls == [('add', 'a'), ('add', 'b'), ('focus', 'a')]
+
+
+def test_released_when_the_group_empties():
+    template = Template()
+    group = Group([LazyLayout(Template()), LazyLayout(template)])
+    layout = group.layouts[1]
+    layout.add('a')
+    layout.info()
+
+    layout.remove('a')
+    assert template.calls[-1] == ('finalize',)
+    assert layout._layout is None
@@ -0,0 +1,69 @@
+'''
+Tests for ScratchpadRegistry: windows moved without the registry being told
+(M-S-<n>) still need to be found on the group they ended up on.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scratchpads import SCRATCHPAD, ScratchpadRegistry  # noqa: E402
+
+
+class Group:
+    def __init__(self, name):
+        self.name = name
+
+
+class Window:
+    def __init__(self, groups, group_name):
+        self.groups = groups
+        self.group = groups[group_name]
+
+    def togroup(self, group_name):
+        self.group = self.groups[group_name]
+
+
+def _groups():
+    return {name: Group(name) for name in ('1', '2', SCRATCHPAD)}
+
+
+def test_hide_sends_windows_back_to_the_scratchpad():
+    groups = _groups()
+    registry = ScratchpadRegistry()
+    window = Window(groups, SCRATCHPAD)
+    registry.add(window)
+
+    window.togroup('1')
+    registry.moved(window, '1')
+    registry.hide('1')
+
+    assert window.group.name == SCRATCHPAD
+    assert registry.on_group('1') == []
+
+
+def test_hide_finds_windows_moved_behind_our_back():
+    groups = _groups()
+    registry = ScratchpadRegistry()
+    window = Window(groups, SCRATCHPAD)
+    registry.add(window)
+    window.togroup('1')
+    registry.moved(window, '1')
+
+    # M-S-2: qtile moves the window without telling the registry
+    window.togroup('2')
+
+    registry.hide('2')
+    assert window.group.name == SCRATCHPAD
+    assert registry.on_group('1') == []
+
+
+def test_windows_without_a_group_are_forgotten():
+    groups = _groups()
+    registry = ScratchpadRegistry()
+    window = Window(groups, SCRATCHPAD)
+    registry.add(window)
+
+    window.group = None
+    assert registry.on_group(SCRATCHPAD) == []
+    assert window not in registry
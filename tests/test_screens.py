@@ -0,0 +1,204 @@
+'''
+Tests for screens.py against fakes shaped like qtile 0.13's xcbq.Connection
+(where `extensions` is a method and `xinerama` is only set if the server
+supports it).
+'''
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('libqtile')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import screens  # noqa: E402
+from polling import PollScheduler  # noqa: E402
+
+
+class Output:
+    def __init__(self, x, y, width, height):
+        self.x_org = self.x = x
+        self.y_org = self.y = y
+        self.width = width
+        self.height = height
+
+
+class Xinerama:
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def query_screens(self):
+        return self.outputs
+
+
+class Connection:
+    '''Like xcbq.Connection: extensions() is a method, not a set'''
+    def __init__(self, outputs, xinerama=True):
+        self.pseudoscreens = [Output(0, 0, 1920, 1080)]
+        if xinerama:
+            self.xinerama = Xinerama(outputs)
+
+    def extensions(self):
+        return {'xinerama'} if hasattr(self, 'xinerama') else set()
+
+
+class Pool:
+    '''Records polls rather than running them'''
+    def __init__(self):
+        self.polled = []
+
+    def submit(self, key, func, callback):
+        self.polled.append(func)
+        return True
+
+
+class Widget:
+    '''
+    Like a ShellScript under qtile 0.13: finalize unsubscribes from the
+    scheduler and configuring it again doesn't subscribe it again.
+    '''
+    name = 'widget'
+
+    def __init__(self, scheduler, qtile):
+        self.scheduler = scheduler
+        self.qtile = qtile
+        self.scheduler.subscribe(self, 'key', None, poll_now=False)
+
+    def _configure(self, qtile, bar):
+        self.bar = bar
+
+    def finalize(self):
+        self.scheduler.unsubscribe(self, 'key')
+
+    def poll(self):
+        return 'text'
+
+
+class BarWindow:
+    def __init__(self, wid):
+        self.window = self
+        self.wid = wid
+        self.killed = False
+
+    def kill(self):
+        self.killed = True
+
+
+class Bar:
+    def __init__(self, widgets):
+        self.widgets = widgets
+        self.window = None
+        self.windows = 0
+
+    def _configure(self, qtile, screen):
+        self.windows += 1
+        self.window = BarWindow(self.windows)
+        qtile.windowMap[self.window.wid] = self.window
+        for widget in self.widgets:
+            widget._configure(qtile, self)
+
+    def finalize(self):
+        pass
+
+
+class Screen:
+    def __init__(self, x, y, width, height, gaps=()):
+        self.x, self.y, self.width, self.height = x, y, width, height
+        self.gaps = list(gaps)
+        self.qtile = None
+
+    def resize(self, x, y, width, height):
+        self.x, self.y, self.width, self.height = x, y, width, height
+        for gap in self.gaps:
+            gap._configure(self.qtile, self)
+
+
+class Qtile:
+    def __init__(self, conn, screens):
+        self.conn = conn
+        self.screens = screens
+        self.currentScreen = screens[0] if screens else None
+        self.windowMap = {}
+        self.widgetMap = {}
+        self.restarted = False
+
+    def call_later(self, delay, func, *args):
+        func(*args)
+
+    def cmd_restart(self):
+        self.restarted = True
+
+
+def test_query_outputs_uses_xinerama():
+    conn = Connection([Output(0, 0, 1920, 1080), Output(1920, 0, 2560, 1440)])
+    assert screens.query_outputs(conn) == [
+        (0, 0, 1920, 1080), (1920, 0, 2560, 1440)]
+
+
+def test_query_outputs_falls_back_to_pseudoscreens():
+    conn = Connection([], xinerama=False)
+    assert screens.query_outputs(conn) == [(0, 0, 1920, 1080)]
+
+
+def test_topology_merges_mirrored_outputs():
+    conn = Connection([Output(0, 0, 1920, 1080), Output(0, 0, 1280, 1200)])
+    qtile = Qtile(conn, [])
+    assert screens.topology(qtile) == [(0, 0, 1920, 1200)]
+
+
+def test_debouncer_calls_back_when_outputs_change():
+    conn = Connection([Output(0, 0, 1920, 1080), Output(1920, 0, 1920, 1080)])
+    qtile = Qtile(conn, [Screen(0, 0, 1920, 1080)])
+    calls = []
+
+    screens.ScreenChangeDebouncer(calls.append, 0)(qtile)
+    assert calls == [qtile]
+
+
+def test_debouncer_ignores_unchanged_outputs():
+    conn = Connection([Output(0, 0, 1920, 1080)])
+    qtile = Qtile(conn, [Screen(0, 0, 1920, 1080)])
+    calls = []
+
+    screens.ScreenChangeDebouncer(calls.append, 0)(qtile)
+    assert calls == []
+
+
+def test_debouncer_calls_back_if_outputs_cannot_be_read():
+    class Broken(Connection):
+        @property
+        def pseudoscreens(self):
+            raise RuntimeError('X went away')
+
+        @pseudoscreens.setter
+        def pseudoscreens(self, value):
+            pass
+
+    qtile = Qtile(Broken([], xinerama=False), [Screen(0, 0, 1920, 1080)])
+    calls = []
+
+    screens.ScreenChangeDebouncer(calls.append, 0)(qtile)
+    assert calls == [qtile]
+
+
+def test_resized_screens_keep_polling():
+    qtile = Qtile(Connection([Output(0, 0, 2560, 1440)]), [])
+    pool = Pool()
+    scheduler = PollScheduler(pool)
+    widget = Widget(scheduler, qtile)
+    bar = Bar([widget])
+    screen = Screen(0, 0, 1920, 1080, [bar])
+    screen.qtile = qtile
+    qtile.screens.append(screen)
+    qtile.currentScreen = screen
+    bar._configure(qtile, screen)
+    old_window = bar.window
+
+    screens.reconfigure_screens(qtile, [screen], None)
+
+    assert (screen.width, screen.height) == (2560, 1440)
+    assert old_window.killed and old_window.wid not in qtile.windowMap
+    assert bar.window is not old_window
+
+    scheduler.poll_now('key')
+    assert pool.polled == [widget.poll]
@@ -0,0 +1,233 @@
+'''
+Set the wallpaper from inside qtile.
+
+Forking `feh --bg-fill` means decoding and rescaling the full size image
+every time we start, restart or the monitors change. Instead we:
+    - scale the image to fill each output once (off the event loop) and keep
+      the result in CACHE_DIR/wallpapers, keyed by the source file (path,
+      size and mtime) and the output resolution
+    - paint the cached images straight onto a root window pixmap and set
+      _XROOTPMAP_ID so that compositors and pseudo-transparent programs can
+      find it. Like feh, this is done on a short lived X connection with
+      RetainPermanent so the pixmap survives qtile exiting or restarting.
+
+Restarts and hotplugs to a resolution we have seen before only need to load
+a PNG. If cairocffi can't decode the image (no gdk-pixbuf) or anything goes
+wrong talking to X we fall back to feh.
+'''
+import asyncio
+import hashlib
+import os
+
+import cairocffi
+import xcffib
+import xcffib.xproto
+from libqtile.log_utils import logger
+
+from settings import CACHE_DIR, WALLPAPER
+from helpers import run_async
+
+try:
+    from cairocffi.pixbuf import decode_to_image_surface
+except (ImportError, OSError):
+    # cairocffi loads gdk-pixbuf when the module is imported
+    decode_to_image_surface = None
+
+
+WALLPAPER_CACHE = os.path.join(CACHE_DIR, 'wallpapers')
+MAX_CACHED = 20
+
+
+def cache_path(source, width, height, cache_dir=WALLPAPER_CACHE):
+    '''Where the scaled version of `source` for an output lives'''
+    stat = os.stat(source)
+    key = '%s:%d:%d' % (
+        os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, '%s-%dx%d.png' % (digest, width, height))
+
+
+def _prune(cache_dir, keep=MAX_CACHED):
+    '''Remove the least recently written images past `keep`'''
+    try:
+        paths = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir)]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[keep:]:
+            os.remove(path)
+    except OSError:
+        logger.exception('Unable to prune the wallpaper cache')
+
+
+def scale_to_fill(source, width, height, dest):
+    '''
+    Scale an image to cover width x height (cropping the overflow evenly
+    like feh --bg-fill) and save it as a PNG. This is slow for big images so
+    it is run on an executor.
+    '''
+    with open(source, 'rb') as f:
+        image, _ = decode_to_image_surface(f.read())
+
+    img_w, img_h = image.get_width(), image.get_height()
+    scale = max(width / img_w, height / img_h)
+
+    surface = cairocffi.ImageSurface(cairocffi.FORMAT_RGB24, width, height)
+    ctx = cairocffi.Context(surface)
+    ctx.translate((width - img_w * scale) / 2, (height - img_h * scale) / 2)
+    ctx.scale(scale, scale)
+    ctx.set_source_surface(image)
+    ctx.get_source().set_filter(cairocffi.FILTER_BEST)
+    ctx.paint()
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = '%s.%d.tmp' % (dest, os.getpid())
+    surface.write_to_png(tmp)
+    os.replace(tmp, dest)
+
+    return dest
+
+
+def prepare(source, outputs, cache_dir=WALLPAPER_CACHE):
+    '''Make sure that there is a scaled image for each output size'''
+    paths = {}
+    for _, _, width, height in outputs:
+        if (width, height) in paths:
+            continue
+
+        path = cache_path(source, width, height, cache_dir)
+        if not os.path.exists(path):
+            scale_to_fill(source, width, height, path)
+            _prune(cache_dir)
+        paths[(width, height)] = path
+
+    return paths
+
+
+def _root_visual(screen):
+    for depth in screen.allowed_depths:
+        for visual in depth.visuals:
+            if visual.visual_id == screen.root_visual:
+                return visual
+
+    return None
+
+
+def _atom(conn, name):
+    return conn.core.InternAtom(False, len(name), name).reply().atom
+
+
+def _pixmap_property(conn, window, atom):
+    reply = conn.core.GetProperty(
+        False, window, atom, xcffib.xproto.Atom.PIXMAP, 0, 1).reply()
+    if reply.type != xcffib.xproto.Atom.PIXMAP or not reply.value_len:
+        return None
+
+    return reply.value.to_atoms()[0]
+
+
+def _owned_by(resource, setup):
+    '''Was `resource` allocated by the client with this connection setup?'''
+    return resource & ~setup.resource_id_mask == setup.resource_id_base
+
+
+def paint_root(outputs, paths, display=None, protect=None):
+    '''
+    Paint the scaled images onto a new root window pixmap.
+
+    This uses its own X connection which is closed with RetainPermanent so
+    that the pixmap outlives it (and qtile restarting). Whoever owned the
+    previous _XROOTPMAP_ID pixmap (feh, xsetroot or us last time) is killed
+    to free it, which is what feh and xsetroot do. As they do, this is only
+    done if ESETROOT_PMAP_ID matches, and never for ids belonging to the
+    `protect` connection setup (qtile itself).
+    '''
+    conn = xcffib.connect(display=display or os.environ.get('DISPLAY'))
+    try:
+        screen = conn.get_setup().roots[conn.pref_screen]
+        root = screen.root
+        # Outputs rather than the setup info: that is stale after xrandr
+        width = max(x + w for x, _, w, _ in outputs)
+        height = max(y + h for _, y, _, h in outputs)
+
+        pixmap = conn.generate_id()
+        conn.core.CreatePixmap(screen.root_depth, pixmap, root, width, height)
+
+        surface = cairocffi.XCBSurface(
+            conn, pixmap, _root_visual(screen), width, height)
+        ctx = cairocffi.Context(surface)
+        ctx.set_source_rgb(0, 0, 0)
+        ctx.paint()
+
+        for x, y, w, h in outputs:
+            image = cairocffi.ImageSurface.create_from_png(paths[(w, h)])
+            ctx.set_source_surface(image, x, y)
+            ctx.paint()
+
+        surface.flush()
+        surface.finish()
+
+        atoms = [_atom(conn, name) for name in (
+            '_XROOTPMAP_ID', 'ESETROOT_PMAP_ID')]
+
+        old = [_pixmap_property(conn, root, atom) for atom in atoms]
+        if old[0] is not None and old[0] == old[1] and not (
+                protect is not None and _owned_by(old[0], protect)):
+            conn.core.KillClient(old[0])
+
+        for atom in atoms:
+            conn.core.ChangeProperty(
+                xcffib.xproto.PropMode.Replace, root, atom,
+                xcffib.xproto.Atom.PIXMAP, 32, 1, [pixmap])
+
+        conn.core.ChangeWindowAttributes(
+            root, xcffib.xproto.CW.BackPixmap, [pixmap])
+        conn.core.ClearArea(False, root, 0, 0, width, height)
+
+        conn.core.SetCloseDownMode(xcffib.xproto.CloseDown.RetainPermanent)
+        conn.flush()
+    finally:
+        conn.disconnect()
+
+
+def _feh(source):
+    return run_async(['feh', '--no-fehbg', '--bg-fill', source])
+
+
+# Paints are done one at a time. Two overlapping paints (startup and the
+# reconfigure after xrandr for example) would each kill the pixmap they saw
+# in _XROOTPMAP_ID, so one of the new pixmaps would never be freed.
+_paint_lock = None
+
+
+async def _set_wallpaper(qtile, source, loop):
+    global _paint_lock
+    if _paint_lock is None:
+        _paint_lock = asyncio.Lock()
+
+    async with _paint_lock:
+        if decode_to_image_surface is None:
+            await _feh(source)
+            return
+
+        # Read the outputs now rather than when we were called: they may have
+        # changed while we were waiting for the last paint to finish
+        outputs = [(s.x, s.y, s.width, s.height) for s in qtile.screens]
+        # Don't let a stale _XROOTPMAP_ID get qtile itself killed
+        protect = qtile.conn.conn.get_setup()
+
+        try:
+            paths = await loop.run_in_executor(None, prepare, source, outputs)
+            await loop.run_in_executor(
+                None, paint_root, outputs, paths, None, protect)
+        except Exception:
+            logger.exception('Unable to set wallpaper in process: using feh')
+            await _feh(source)
+
+
+def set_wallpaper(qtile, source=WALLPAPER, loop=None):
+    '''
+    Set the wallpaper to fill each of qtile's screens without blocking the
+    event loop. Returns a future.
+    '''
+    loop = loop or asyncio.get_event_loop()
+    return asyncio.ensure_future(
+        _set_wallpaper(qtile, source, loop), loop=loop)
@@ -1,12 +1,99 @@
 import os
+import signal
 import subprocess
+from collections import OrderedDict
 
-from settings import SCRIPT_DIR
+from settings import SCRIPT_DIR, POLL_TIMEOUT, LAYOUT_CACHE_SIZE
+from collectors import CollectorUnavailable, get_collector
+from polling import scheduler
+from cache import result_cache
+from events import hub
+from clickd import send_click
+from sampler import interface_rates, system_sampler
 
-from libqtile.widget import base
+from libqtile import bar
+from libqtile.log_utils import logger
+from libqtile.widget import base, CPUGraph, MemoryGraph, NetGraph
+from libqtile.widget.graph import _Graph
 
 
-class ShellScript(base.ThreadedPollText):
+def _kill_group(proc, wait=1):
+    '''Kill a process started with start_new_session and all of its children'''
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+    # Anything that escaped the group can keep the pipe open: don't wait on it
+    try:
+        proc.communicate(timeout=wait)
+    except subprocess.TimeoutExpired:
+        proc.stdout.close()
+        proc.wait()
+
+
+def _hashable(value):
+    '''A hashable version of a (possibly nested) config value'''
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_hashable(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+
+    return value
+
+
+class LayoutCache:
+    '''
+    LRU cache of pango text layouts. Parsing markup and shaping text is the
+    expensive part of updating a text widget and scripts tend to flip between
+    a handful of outputs so we hang on to the layouts for recent outputs.
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._layouts = OrderedDict()
+
+    def get(self, key, factory):
+        '''Get the layout for `key`, calling `factory` to make it if needed'''
+        layout = self._layouts.get(key)
+        if layout is not None:
+            self._layouts.move_to_end(key)
+            self.hits += 1
+            return layout
+
+        self.misses += 1
+        layout = self._layouts[key] = factory()
+
+        while len(self._layouts) > self.size:
+            _, old = self._layouts.popitem(last=False)
+            if hasattr(old, 'finalize'):
+                old.finalize()
+
+        return layout
+
+    def clear(self, keep=None):
+        '''
+        Finalise and drop every cached layout. `keep` is left alone for
+        whoever else owns it (the widget finalises its current layout).
+        '''
+        layouts, self._layouts = self._layouts, OrderedDict()
+        for layout in layouts.values():
+            if layout is not keep and hasattr(layout, 'finalize'):
+                layout.finalize()
+
+    def info(self):
+        return {
+            'size': len(self._layouts),
+            'max_size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class ShellScript(base.InLoopPollText):
     '''
     A generic text widget that polls using a poll function to get its text
     and accepts mouse interaction through the bar.
@@ -15,44 +102,416 @@ class ShellScript(base.ThreadedPollText):
         WIDGET_X_LOC  - X location in pixels
         WIDGET_Y_LOC  - Y location in pixels
 
+        WIDGET_REPEAT - Number of times the button was pressed (scrolling,
+                        only if `scroll_repeat` is set)
+
     Mouse interactions come through as ints mapped as follows
         1: LEFT
         2: RIGHT
         3: MIDDLE
         4: SCROLL_UP
         5: SCROLL_DOWN
+
+    Clicks are handed off to a helper process (see clickd.py) so that the bar
+    doesn't block while the script runs.
+
+    If a `collector` is named then the widget text is generated in-process
+    (see collectors.py) and the script is only used for handling clicks, or
+    as a fallback if the collector's data source is unavailable.
+
+    Polling is handled by the shared scheduler in polling.py so identical
+    widgets on different screens only run their script once per interval,
+    using a shared pool of worker threads.
+
+    Text layouts are cached (see LayoutCache) so that flipping back to a
+    recent output doesn't need the markup to be parsed and laid out again.
+
+    Setting `cache_ttl` keeps the last output on disk so that it can be shown
+    immediately after a restart. The script is only re-run straight away if
+    the cached output is older than `cache_ttl` seconds.
     '''
     orientations = base.ORIENTATION_HORIZONTAL
     defaults = [
         ('fname', None, 'Filename in script directory'),
         ('script_dir', SCRIPT_DIR, 'Directory containing the script'),
+        ('collector', None, 'Name of an in-process collector to poll'),
+        ('collector_config', {}, 'Options to pass to the collector'),
+        ('timeout', POLL_TIMEOUT, 'Seconds to wait before killing the script'),
+        ('cache_ttl', None, 'Seconds that cached output is considered fresh'),
+        ('layout_cache_size', LAYOUT_CACHE_SIZE, 'Number of layouts to keep'),
+        ('scroll_repeat', False, 'Script handles WIDGET_REPEAT for scrolls'),
     ]
 
     def __init__(self, **config):
-        base.ThreadedPollText.__init__(self, **config)
+        base.InLoopPollText.__init__(self, **config)
         self.add_defaults(ShellScript.defaults)
-        self.fname = self.script_dir + config['fname']
+
+        if self.fname is None and self.collector is None:
+            raise ValueError('ShellScript needs an fname or a collector')
+
+        if self.fname is not None:
+            self.fname = self.script_dir + self.fname
+
+        self._collector = None
+        if self.collector is not None:
+            self._collector = get_collector(
+                self.collector, **self.collector_config)
+
+        self._layouts = LayoutCache(self.layout_cache_size)
+        # The style the cached layouts were made with and the current layout
+        # if the cache doesn't own it (i.e. the one from _TextBox._configure)
+        self._style = None
+        self._loose = None
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        current = getattr(self, 'layout', None)
+        if current is None or value is None:
+            return
+
+        style = (self.font, self.fontsize, self.foreground, self.fontshadow)
+        if style != self._style:
+            # _TextBox applies font and colour changes to the current layout
+            # in place so anything we have cached is for the old style
+            self._layouts.clear(keep=current)
+            self._loose = current
+            self._style = style
+
+        self.layout = self._layouts.get(
+            (value,) + style,
+            lambda: self.drawer.textlayout(
+                value, self.foreground, self.font, self.fontsize,
+                self.fontshadow, markup=self.markup),
+        )
+
+        if self._loose is not None and self._loose is not self.layout:
+            self._loose.finalize()
+            self._loose = None
+
+    def cmd_layout_cache_info(self):
+        '''Hit/miss counts for the text layout cache'''
+        return self._layouts.info()
+
+    @property
+    def poll_key(self):
+        '''Widgets with the same key show the same output'''
+        return (
+            self.fname, self.collector, _hashable(self.collector_config),
+            self.update_interval,
+        )
+
+    def _cache_key(self):
+        '''Cache against the script and its mtime or the collector config'''
+        if self.collector is not None:
+            return 'collector:%s:%r' % (
+                self.collector, _hashable(self.collector_config)), None
+
+        try:
+            return self.fname, os.stat(self.fname).st_mtime
+        except OSError:
+            return None, None
+
+    def timer_setup(self):
+        '''
+        Show any cached output and hand our timer off to the shared scheduler
+        '''
+        poll_now = True
+
+        if self.cache_ttl is not None:
+            key, version = self._cache_key()
+            cached = result_cache.get(key, version) if key else None
+            if cached is not None:
+                text, age = cached
+                self._set_text(text)
+                poll_now = age >= self.cache_ttl
+
+        scheduler.subscribe(
+            self, self.poll_key, self.update_interval, poll_now=poll_now)
+
+    def update(self, text):
+        if self.cache_ttl is not None:
+            key, version = self._cache_key()
+            if key is not None:
+                result_cache.put(key, version, text)
+
+        self._set_text(text)
+
+    def _set_text(self, text):
+        '''
+        InLoopPollText.update skips unchanged text and only redraws this
+        widget if its width stays the same. When the width changes it redraws
+        the whole bar: on a DamageBar we only redraw the widgets that moved.
+        '''
+        if text == self.text or not hasattr(self.bar, 'damage'):
+            base.InLoopPollText.update(self, text)
+            return
+
+        old_width = self.layout.width
+        self.text = text
+
+        if self.layout.width == old_width:
+            self.draw()
+        else:
+            self.bar.damage(self)
+
+    def tick(self):
+        scheduler.poll_now(self.poll_key)
+
+    def _configure(self, qtile, bar):
+        # Cached layouts belong to the drawer they were created on, which
+        # gets replaced when the bar is configured again
+        self._layouts.clear()
+        if self._loose is not None:
+            self._loose.finalize()
+
+        base.InLoopPollText._configure(self, qtile, bar)
+        self._loose = self.layout
+        self._style = (
+            self.font, self.fontsize, self.foreground, self.fontshadow)
+
+    def finalize(self):
+        scheduler.unsubscribe(self, self.poll_key)
+        self._layouts.clear(keep=getattr(self, 'layout', None))
+        self._loose = None
+        base.InLoopPollText.finalize(self)
 
     def poll(self):
-        '''When polled just run the script without click info'''
+        '''
+        When polled use the collector if we have one, otherwise just run the
+        script without click info
+        '''
+        if self._collector is not None:
+            try:
+                return self._collector.poll()
+            except CollectorUnavailable:
+                if self.fname is None:
+                    return ''
+
         return self._run_script()
 
-    def _run_script(self, btn=None, x=None, y=None):
-        '''Run the script, optionally passing click info in the environment'''
-        if btn is not None:
-            btn_env = os.environ.copy()
-            btn_env['WIDGET_BUTTON'] = str(btn)
-            btn_env['WIDGET_X_LOC'] = str(x)
-            btn_env['WIDGET_Y_LOC'] = str(y)
-            result = subprocess.run(
-                self.fname, stdout=subprocess.PIPE, env=btn_env)
-        else:
-            result = subprocess.run(self.fname, stdout=subprocess.PIPE)
+    def _run_script(self):
+        '''
+        Run the script without click info. Polls are killed if they run for
+        longer than `timeout` seconds.
+        '''
+        # The script gets its own process group so that anything it starts
+        # is killed along with it: otherwise grandchildren hold the pipe open
+        # and we block reading it long after the timeout.
+        proc = subprocess.Popen(
+            self.fname, stdout=subprocess.PIPE, start_new_session=True)
+
+        try:
+            output, _ = proc.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning('%s timed out', self.fname)
+            _kill_group(proc)
+            return None
 
-        return result.stdout.decode()
+        return output.decode()
 
     def button_press(self, x, y, button):
         '''
-        Pass the information off to the script but ignore the script output
+        Pass the information off to the script's click helper. Any output
+        from the script is ignored.
         '''
-        return self._run_script(btn=button, x=x, y=y)
+        if self.fname is None:
+            return
+
+        send_click(self.fname, button, x, y, coalesce=self.scroll_repeat)
+
+
+class EventScript(ShellScript):
+    '''
+    A ShellScript that refreshes when the kernel tells us that something has
+    changed rather than on a fixed interval. `triggers` is a list of topics
+    from events.py, i.e.
+        ('link', 'addr', 'route')   :: network changes
+        ('uevent:power_supply',)    :: AC plugged in / battery level changes
+
+    If we are able to listen for all of the triggers then we only poll every
+    `idle_interval` seconds as a safety net. Otherwise we fall back to
+    polling every `update_interval` seconds like a normal ShellScript.
+    '''
+    defaults = [
+        ('triggers', (), 'Event topics that should cause a refresh'),
+        ('idle_interval', None, 'Poll interval when events are available'),
+        ('event_delay', 0.1, 'Seconds to let a burst of events settle'),
+    ]
+
+    def __init__(self, **config):
+        ShellScript.__init__(self, **config)
+        self.add_defaults(EventScript.defaults)
+        self._pending = None
+        self._subscribed = []
+
+    def timer_setup(self):
+        for topic in self.triggers:
+            if hub.subscribe(topic, self._on_event):
+                self._subscribed.append(topic)
+
+        if self.triggers and len(self._subscribed) == len(self.triggers):
+            self.update_interval = self.idle_interval
+
+        ShellScript.timer_setup(self)
+
+    def _on_event(self):
+        if self._pending is None:
+            self._pending = self.qtile.call_later(
+                self.event_delay, self._refresh)
+
+    def _refresh(self):
+        self._pending = None
+        self.tick()
+
+    def finalize(self):
+        for topic in self._subscribed:
+            hub.unsubscribe(topic, self._on_event)
+
+        if self._pending is not None:
+            self._pending.cancel()
+
+        ShellScript.finalize(self)
+
+
+class DamageBar(bar.Bar):
+    '''
+    A bar that can redraw just the parts of itself that have changed.
+
+    Widgets that change width call `damage(widget)` rather than `draw()`: the
+    bar is laid out again but only the damaged widget and any widgets that
+    moved or changed size as a result are redrawn. Calling `draw()` still
+    redraws everything as widgets expect.
+    '''
+    def __init__(self, widgets, size, **config):
+        bar.Bar.__init__(self, widgets, size, **config)
+        self._damaged = set()
+        self._full_draw = False
+        self._draw_queued = False
+
+    def draw(self):
+        if not self.widgets:
+            return
+
+        self._full_draw = True
+        self._queue_draw()
+
+    def damage(self, widget):
+        self._damaged.add(widget)
+        self._queue_draw()
+
+    def _queue_draw(self):
+        if not self._draw_queued:
+            self._draw_queued = True
+            self.qtile.call_soon(self._draw_damaged)
+
+    def _draw_damaged(self):
+        self._draw_queued = False
+        damaged, self._damaged = self._damaged, set()
+
+        if self._full_draw:
+            self._full_draw = False
+            self._actual_draw()
+            return
+
+        before = {w: (w.offset, w.length) for w in self.widgets}
+        self._resize(self.length, self.widgets)
+
+        for w in self.widgets:
+            if w in damaged or (w.offset, w.length) != before[w]:
+                w.draw()
+
+        # Clear anything left behind if the widgets now take up less room
+        if not self.widgets:
+            return
+
+        last = self.widgets[-1]
+        end = last.offset + last.length
+        if end < self.length:
+            self.drawer.draw(offsetx=end, width=self.length - end)
+
+
+class LazyBar(DamageBar):
+    '''
+    A DamageBar that takes a function for building its widgets rather than
+    the widgets themselves. The widgets are only created when qtile first
+    configures the bar, so a Screen in the config for a monitor that isn't
+    attached never creates (or starts polling) any widgets.
+    '''
+    def __init__(self, make_widgets, size, **config):
+        DamageBar.__init__(self, [], size, **config)
+        self._make_widgets = make_widgets
+
+    def build(self):
+        '''Create the widgets if we haven't already'''
+        if self._make_widgets is not None:
+            self.widgets = self._make_widgets()
+            self._make_widgets = None
+
+        return self.widgets
+
+    def _configure(self, qtile, screen):
+        self.build()
+        DamageBar._configure(self, qtile, screen)
+
+
+# The graphs below read from the shared sampler in sampler.py rather than
+# each reading /proc for themselves (once per graph, per screen). They call
+# _Graph.__init__ directly as the stock __init__ methods read /proc to seed
+# their own counters.
+class SharedCPUGraph(CPUGraph):
+    '''CPUGraph for all cores fed from the shared sampler'''
+    def __init__(self, **config):
+        _Graph.__init__(self, **config)
+        self.add_defaults(CPUGraph.defaults)
+        self.maxvalue = 100
+        if self.core != 'all':
+            # We only sample the total for all cores
+            self.oldvalues = self._getvalues()
+
+    def update_graph(self):
+        if self.core != 'all':
+            return CPUGraph.update_graph(self)
+
+        system_sampler.refresh(self.frequency)
+        cpu, _, _ = system_sampler.latest()
+        if cpu is not None:
+            self.push(cpu)
+
+
+class SharedMemoryGraph(MemoryGraph):
+    '''MemoryGraph fed from the shared sampler (values are in kB)'''
+    def __init__(self, **config):
+        _Graph.__init__(self, **config)
+        system_sampler.refresh(self.frequency)
+        _, mem_used, self.maxvalue = system_sampler.latest()
+        self.fulfill(mem_used)
+
+    def update_graph(self):
+        system_sampler.refresh(self.frequency)
+        _, mem_used, _ = system_sampler.latest()
+        self.push(mem_used)
+
+
+class SharedNetGraph(NetGraph):
+    '''NetGraph fed from the shared sampler (values are in bytes/sec)'''
+    def __init__(self, **config):
+        _Graph.__init__(self, **config)
+        self.add_defaults(NetGraph.defaults)
+        if self.interface == 'auto':
+            try:
+                self.interface = self.get_main_iface()
+            except RuntimeError:
+                logger.warning('NetGraph: unable to find main interface')
+                self.interface = 'lo'
+
+    def update_graph(self):
+        system_sampler.refresh(self.frequency)
+        rates = interface_rates(self.interface).rates()
+        if rates is not None:
+            rx, tx = rates
+            self.push(rx if self.bandwidth_type == 'down' else tx)
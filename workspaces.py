@@ -0,0 +1,104 @@
+'''
+Which group is showing on which screen.
+
+qtile only stores this one way round (screen.group) so finding the screen a
+group is on means scanning every screen. Here we keep both directions,
+updated from the setgroup and current_screen_change hooks, so that jumping
+to a group is a couple of dict/list lookups however many monitors we have.
+
+Each screen also keeps a short most-recently-used list of the groups it has
+shown. This backs a screen preserving version of toggle_group: M-<Tab> never
+pulls over a group that is showing on another monitor.
+
+Entries are checked when they are used. If something has changed without a
+hook firing (screens being reconfigured for example) we rebuild from
+qtile.screens and carry on.
+'''
+HISTORY = 10
+
+
+class WorkspaceIndex:
+    '''A bidirectional group <-> screen index with per screen history'''
+    def __init__(self, history=HISTORY):
+        self.history = history
+        self._screen_of = {}
+        self._group_on = []
+        self._mru = []
+        self.current = None
+        self.previous = None
+
+    def sync(self, qtile):
+        '''Bring the index in line with qtile's screens'''
+        screens = qtile.screens
+        del self._group_on[len(screens):]
+        del self._mru[len(screens):]
+        while len(self._group_on) < len(screens):
+            self._group_on.append(None)
+            self._mru.append([])
+
+        self._screen_of = {}
+        for index, screen in enumerate(screens):
+            name = screen.group.name if screen.group else None
+            old = self._group_on[index]
+            if old is not None and old != name:
+                self._push(index, old)
+
+            self._group_on[index] = name
+            if name is not None:
+                self._screen_of[name] = index
+
+        current = qtile.currentScreen.index
+        if current != self.current:
+            self.previous, self.current = self.current, current
+
+    def _push(self, index, name):
+        mru = self._mru[index]
+        if name in mru:
+            mru.remove(name)
+        mru.append(name)
+        del mru[:-self.history]
+
+    def screen_of(self, qtile, group_name):
+        '''The index of the screen showing `group_name` (None if hidden)'''
+        index = self._screen_of.get(group_name)
+        if index is None:
+            return None
+
+        screens = qtile.screens
+        if index >= len(screens) or screens[index].group is None or \
+                screens[index].group.name != group_name:
+            # Stale: rebuild and try again
+            self.sync(qtile)
+            return self._screen_of.get(group_name)
+
+        return index
+
+    def other_screen(self, qtile, index):
+        '''
+        The screen we were on before `index`, falling back to the next one
+        along. Returns None if there is only one screen.
+        '''
+        n_screens = len(qtile.screens)
+        if n_screens < 2:
+            return None
+
+        if self.previous is not None and self.previous != index and \
+                self.previous < n_screens:
+            return self.previous
+
+        return (index + 1) % n_screens
+
+    def last_hidden(self, qtile, index):
+        '''
+        The most recently shown group on screen `index` that isn't currently
+        on any screen.
+        '''
+        self.sync(qtile)
+        for name in reversed(self._mru[index]):
+            if name not in self._screen_of and name in qtile.groupMap:
+                return name
+
+        return None
+
+
+index = WorkspaceIndex()